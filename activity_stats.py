@@ -0,0 +1,119 @@
+"""Time-bucketed access activity counters.
+
+Every AccessLog entry is counted into an hourly and a daily ring of
+fixed-size buckets, as "<operation>" for successes and "failure" for
+failures, in total and broken down by script and by actor (admin, agent or
+system). Queries walk at most the ring size, never the log.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from config import Config
+
+RESOLUTIONS = {"hour": 3600, "day": 86400}
+
+def _event(operation, status):
+    return operation if status == 'success' else 'failure'
+
+def _add(counts, event):
+    counts[event] = counts.get(event, 0) + 1
+
+class BucketRing:
+    """Fixed number of consecutive time buckets, reused in a ring as time moves on"""
+
+    def __init__(self, width, size):
+        self.width = width
+        self.size = size
+        self._indexes = [None] * size  # Absolute bucket index held by each slot
+        self._buckets = [None] * size
+
+    def _bucket(self, index):
+        slot = index % self.size
+        if self._indexes[slot] != index:
+            self._indexes[slot] = index
+            self._buckets[slot] = {"totals": {}, "scripts": {}, "actors": {}}
+        return self._buckets[slot]
+
+    def record(self, timestamp, event, pine_id, actor):
+        bucket = self._bucket(int(timestamp // self.width))
+        _add(bucket["totals"], event)
+        _add(bucket["scripts"].setdefault(pine_id, {}), event)
+        _add(bucket["actors"].setdefault(actor, {}), event)
+
+    def series(self, count, now, pine_id=None, actor=None):
+        """Counts of the newest count buckets, oldest first"""
+        current = int(now // self.width)
+        points = []
+        for index in range(current - min(count, self.size) + 1, current + 1):
+            slot = index % self.size
+            bucket = self._buckets[slot] if self._indexes[slot] == index else None
+            counts = {}
+            if bucket is not None:
+                if pine_id is not None:
+                    counts = bucket["scripts"].get(pine_id, {})
+                elif actor is not None:
+                    counts = bucket["actors"].get(actor, {})
+                else:
+                    counts = bucket["totals"]
+            points.append({
+                "start": datetime.fromtimestamp(index * self.width, timezone.utc).isoformat(),
+                **counts
+            })
+        return points
+
+    def top_scripts(self, count, now, limit=10):
+        """Scripts with the most events over the newest count buckets"""
+        current = int(now // self.width)
+        totals = {}
+        for index in range(current - min(count, self.size) + 1, current + 1):
+            slot = index % self.size
+            if self._indexes[slot] != index:
+                continue
+            for pine_id, counts in self._buckets[slot]["scripts"].items():
+                totals[pine_id] = totals.get(pine_id, 0) + sum(counts.values())
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+class ActivityStats:
+    """Hourly and daily activity rings updated on every access log entry"""
+
+    def __init__(self, hours=None, days=None):
+        self.rings = {
+            "hour": BucketRing(RESOLUTIONS["hour"], hours or Config.STATS_HOURLY_BUCKETS),
+            "day": BucketRing(RESOLUTIONS["day"], days or Config.STATS_DAILY_BUCKETS)
+        }
+        self._lock = threading.Lock()
+
+    def record(self, operation, status, pine_id, actor="system", timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        event = _event(operation, status)
+        with self._lock:
+            for ring in self.rings.values():
+                ring.record(timestamp, event, pine_id, actor)
+
+    def query(self, resolution="hour", count=24, pine_id=None, actor=None):
+        """Return the series and its totals for the newest count buckets"""
+        ring = self.rings[resolution]
+        now = time.time()
+        with self._lock:
+            series = ring.series(count, now, pine_id, actor)
+            top_scripts = ring.top_scripts(count, now) if pine_id is None and actor is None else []
+        totals = {}
+        for point in series:
+            for key, value in point.items():
+                if key != "start":
+                    totals[key] = totals.get(key, 0) + value
+        return {
+            "resolution": resolution,
+            "buckets": len(series),
+            "series": series,
+            "totals": totals,
+            "top_scripts": [{"script_id": pine_id, "events": events} for pine_id, events in top_scripts]
+        }
+
+    def reset(self):
+        with self._lock:
+            for name, ring in list(self.rings.items()):
+                self.rings[name] = BucketRing(ring.width, ring.size)
+
+# Global activity counters
+activity_stats = ActivityStats()
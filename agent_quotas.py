@@ -0,0 +1,85 @@
+"""Per-agent-session quotas on grant requests.
+
+Agents share one login, so quotas are kept per session (its client id). An
+agent may grant AGENT_QUOTA_GRANTS scripts per AGENT_QUOTA_WINDOW seconds
+(a sliding window) and have AGENT_QUOTA_CONCURRENT grant requests in flight
+at once; 0 disables either limit. Requests over quota are answered with HTTP
+429 and a Retry-After header before anything reaches TradingView. Admin
+sessions are not limited. Counts are kept per process.
+"""
+import threading
+import time
+from collections import deque
+from config import Config
+import metrics
+
+class AgentQuotas:
+    """Sliding-window grant counts and in-flight requests per agent session"""
+
+    def __init__(self, grants=None, window=None, concurrent=None):
+        self.grants = Config.AGENT_QUOTA_GRANTS if grants is None else grants
+        self.window = Config.AGENT_QUOTA_WINDOW if window is None else window
+        self.concurrent = Config.AGENT_QUOTA_CONCURRENT if concurrent is None else concurrent
+        self._usage = {}  # client id -> deque of (timestamp, scripts)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _used(self, client_id, now):
+        usage = self._usage.setdefault(client_id, deque())
+        while usage and usage[0][0] <= now - self.window:
+            usage.popleft()
+        return usage, sum(count for _, count in usage)
+
+    def begin(self, client_id, scripts):
+        """Admit a grant request of scripts; returns None, or the seconds to wait when over quota"""
+        now = time.time()
+        with self._lock:
+            if self.concurrent and self._in_flight.get(client_id, 0) >= self.concurrent:
+                metrics.agent_quota_rejections_total.inc(limit="concurrent")
+                return 1.0
+            if self.grants:
+                usage, used = self._used(client_id, now)
+                if used + scripts > self.grants:
+                    metrics.agent_quota_rejections_total.inc(limit="grants")
+                    if not usage or scripts > self.grants:
+                        return float(self.window)
+                    # Wait until enough earlier grants have left the window
+                    freed = 0
+                    for timestamp, count in usage:
+                        freed += count
+                        if used - freed + scripts <= self.grants:
+                            return max(1.0, timestamp + self.window - now)
+                    return float(self.window)
+                usage.append((now, scripts))
+            self._in_flight[client_id] = self._in_flight.get(client_id, 0) + 1
+            return None
+
+    def end(self, client_id):
+        with self._lock:
+            remaining = self._in_flight.get(client_id, 0) - 1
+            if remaining > 0:
+                self._in_flight[client_id] = remaining
+            else:
+                self._in_flight.pop(client_id, None)
+
+    def usage(self, client_id):
+        with self._lock:
+            _, used = self._used(client_id, time.time())
+            return {"grants_used": used, "grants_limit": self.grants, "window": self.window,
+                    "in_flight": self._in_flight.get(client_id, 0), "concurrent_limit": self.concurrent}
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            sessions = {}
+            for client_id in list(self._usage):
+                usage, used = self._used(client_id, now)
+                if not usage:
+                    del self._usage[client_id]
+                    continue
+                sessions[client_id] = used
+            return {"grants_limit": self.grants, "window": self.window, "concurrent_limit": self.concurrent,
+                    "grants_by_session": sessions, "in_flight": dict(self._in_flight)}
+
+# Global per-session quotas for agents
+agent_quotas = AgentQuotas()
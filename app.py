@@ -1,16 +1,50 @@
 import os
-import logging
 from flask import Flask
 from werkzeug.middleware.proxy_fix import ProxyFix
+from compression import CompressionMiddleware
+from config import Config
+from logging_setup import configure_logging
 
-# Configure logging for production
-log_level = os.getenv("LOG_LEVEL", "INFO")
-logging.basicConfig(level=getattr(logging, log_level.upper()))
+# Configure logging for production (queued, written by a background thread)
+configure_logging(Config.LOG_LEVEL, Config.LOG_FORMAT, Config.LOG_SAMPLE_EVERY)
 
 # create the app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+if Config.COMPRESSION_ENABLED:
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, Config.COMPRESSION_MIN_SIZE, Config.COMPRESSION_LEVEL)
+
+# Fingerprinted static assets (see assets.py)
+import assets
+app.jinja_env.globals['asset_url'] = assets.asset_url
+if Config.ASSET_BUILD_ON_START:
+    assets.build_assets(app.static_folder)
+else:
+    assets.load_manifest(app.static_folder)
 
 # Import routes after app creation
-import routes  # noqa: F401
\ No newline at end of file
+import routes  # noqa: F401
+
+# Seed the default catalog once, instead of on every dashboard request
+from models import PineScript, initialize_default_scripts
+initialize_default_scripts()
+
+# Optional warm-up: validate the TradingView session and open connections off the request path
+if Config.WARMUP_ON_START:
+    from tradingview import tv_api
+    tv_api.start_warm_up([script.pine_id for script in PineScript.get_all()] if Config.WARMUP_PREFETCH_CATALOG else ())
+# Optional scheduled purge of expired grants (one process sweeps at a time)
+if Config.PURGE_ENABLED:
+    from purge import purge_scheduler
+    purge_scheduler.start()
+
+# Optional delivery of access change events to webhooks, files or sockets
+if Config.OUTBOX_ENABLED:
+    from outbox import event_outbox
+    event_outbox.start()  # Also drains journals left by earlier processes
+
+# Optional queue of grants and removals waiting for TradingView to recover
+if Config.PENDING_QUEUE_ENABLED:
+    from pending_operations import pending_operations
+    pending_operations.start()
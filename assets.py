@@ -0,0 +1,132 @@
+"""Fingerprinted, precompressed static assets.
+
+build_assets() copies every CSS/JS file under static/ to
+static/dist/<name>.<hash>.<ext> and writes .gz (and .br when the optional
+brotli package is installed) variants next to each copy. Templates link
+them with asset_url(), and /assets/<path> serves the best encoding the
+browser accepts with immutable cache headers. Run `python assets.py` as a
+build step, or let app start-up build them (ASSET_BUILD_ON_START).
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import shutil
+from flask import request, send_file, url_for, abort
+from compression import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip variants are always written
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+ASSET_EXTENSIONS = ('.css', '.js')
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# logical path (e.g. "css/custom.css") -> fingerprinted path inside dist/
+manifest = {}
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def build_assets(static_folder):
+    """Fingerprint and precompress assets; returns the manifest"""
+    dist_folder = os.path.join(static_folder, DIST_DIR)
+    built = {}
+
+    for root, dirs, files in os.walk(static_folder):
+        if os.path.abspath(root).startswith(os.path.abspath(dist_folder)):
+            continue
+        for filename in files:
+            if not filename.endswith(ASSET_EXTENSIONS):
+                continue
+            source = os.path.join(root, filename)
+            logical = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            stem, extension = os.path.splitext(logical)
+            hashed = f"{stem}.{digest}{extension}"
+            target = os.path.join(dist_folder, hashed)
+
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                _write_atomic(target, data)
+                _write_atomic(f"{target}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    _write_atomic(f"{target}.br", brotli.compress(data, quality=11))
+                logger.info("Built asset %s", hashed)
+            built[logical] = hashed
+
+    os.makedirs(dist_folder, exist_ok=True)
+    _write_atomic(os.path.join(dist_folder, MANIFEST_NAME), json.dumps(built, indent=2).encode())
+    manifest.clear()
+    manifest.update(built)
+    return built
+
+def load_manifest(static_folder):
+    """Load a manifest written by an earlier build step"""
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            manifest.clear()
+            manifest.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+    return manifest
+
+def asset_url(filename):
+    """URL of the fingerprinted asset, falling back to the plain static file"""
+    hashed = manifest.get(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('serve_asset', filename=hashed)
+
+def serve_asset(static_folder, filename):
+    """Serve a fingerprinted asset with immutable caching and precompressed encodings"""
+    dist_folder = os.path.abspath(os.path.join(static_folder, DIST_DIR))
+    path = os.path.abspath(os.path.join(dist_folder, filename))
+    if not path.startswith(dist_folder + os.sep) or not path.endswith(ASSET_EXTENSIONS) or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    encoding = None
+    # Same negotiation as the compression middleware: q=0 declines an encoding
+    accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+    if 'br' in accepted and os.path.isfile(f"{path}.br"):
+        path, encoding = f"{path}.br", 'br'
+    elif ('gzip' in accepted or '*' in accepted) and os.path.isfile(f"{path}.gz"):
+        path, encoding = f"{path}.gz", 'gzip'
+
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+def clean_assets(static_folder):
+    """Remove all built assets"""
+    shutil.rmtree(os.path.join(static_folder, DIST_DIR), ignore_errors=True)
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Fingerprint and precompress static assets")
+    parser.add_argument('--static-folder', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    parser.add_argument('--clean', action='store_true', help="Remove previously built assets first")
+    args = parser.parse_args()
+    if args.clean:
+        clean_assets(args.static_folder)
+    for logical, hashed in build_assets(args.static_folder).items():
+        print(f"{logical} -> {DIST_DIR}/{hashed}")
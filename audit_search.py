@@ -0,0 +1,181 @@
+"""Full-text search over the access audit trail.
+
+Every AccessLog entry is also written to a SQLite database at
+AUDIT_SEARCH_DB with an FTS5 index kept current by a trigger on insert.
+Unlike the in-memory log, the database survives restarts, so searches cover
+months of history. Free text matches username, script name and details,
+words of two or more characters as prefixes ("amy 42" finds "amy_trader
+... HTTP 429"); "quoted phrases" match exactly. Operation, status and actor
+are indexed too, so filters on them are FTS5 column filters, and a time
+range becomes a rowid range (rows are inserted in time order). Results are
+ranked with BM25 (username weighted highest) among the newest
+AUDIT_SEARCH_WINDOW matches, which keeps broad terms fast on large
+histories, and paginated.
+"""
+import re
+import sqlite3
+import logging
+from datetime import datetime
+from config import Config
+from sqlite_pool import SQLitePool
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_log (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    username TEXT NOT NULL,
+    pine_id TEXT,
+    pine_script_name TEXT,
+    operation TEXT NOT NULL,
+    status TEXT NOT NULL,
+    details TEXT,
+    actor TEXT
+);
+CREATE INDEX IF NOT EXISTS audit_log_time ON audit_log (timestamp);
+CREATE VIRTUAL TABLE IF NOT EXISTS audit_fts USING fts5(
+    username, pine_script_name, details, operation, status, actor,
+    content='audit_log', content_rowid='id',
+    tokenize="unicode61 tokenchars '_'", prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS audit_log_ai AFTER INSERT ON audit_log BEGIN
+    INSERT INTO audit_fts (rowid, username, pine_script_name, details, operation, status, actor)
+    VALUES (new.id, new.username, new.pine_script_name, new.details, new.operation, new.status, new.actor);
+END;
+"""
+
+COLUMNS = ("id", "timestamp", "username", "pine_id", "pine_script_name", "operation", "status", "details", "actor")
+FILTERS = ("operation", "status", "actor")
+TERM_PATTERN = re.compile(r'"([^"]+)"|(\S+)')
+MAX_PER_PAGE = 200
+
+def _phrase(text):
+    # Keep only characters the tokenizer indexes, so user input never becomes FTS5 syntax
+    return '"' + ' '.join(re.findall(r'\w+', text)) + '"'
+
+def build_match(query, username='', **filters):
+    """Turn free text and filters into an FTS5 expression (None when there is nothing to match)"""
+    terms = []
+    for phrase, word in TERM_PATTERN.findall(query):
+        if phrase and re.search(r'\w', phrase):
+            terms.append(_phrase(phrase))
+        elif word:
+            # Single characters match exactly; as prefixes they would expand to a large part of the vocabulary
+            terms.extend(f'"{part}"*' if len(part) > 1 else f'"{part}"' for part in re.findall(r'\w+', word))
+
+    clauses = []
+    if terms:
+        clauses.append('{username pine_script_name details} : (' + ' '.join(terms) + ')')
+    if username and re.search(r'\w', username):
+        clauses.append(f'username : {_phrase(username)}')
+    for name in FILTERS:
+        if filters.get(name) and re.search(r'\w', filters[name]):
+            clauses.append(f'{name} : {_phrase(filters[name])}')
+    return ' AND '.join(clauses) or None
+
+class AuditSearchIndex:
+    """SQLite FTS5 mirror of AccessLog"""
+
+    def __init__(self, path=None):
+        self.path = path or Config.AUDIT_SEARCH_DB
+        self.enabled = Config.AUDIT_SEARCH_ENABLED
+        self._pool = SQLitePool(self.path, SCHEMA, pragmas=(
+            "PRAGMA journal_mode=WAL",
+            "PRAGMA synchronous=NORMAL"  # Commits without an fsync each; safe with WAL
+        ))
+
+    def _db(self):
+        return self._pool.connection()
+
+    def add(self, log):
+        """Index one AccessLog entry"""
+        if not self.enabled:
+            return
+        try:
+            with self._db() as conn:
+                conn.execute(
+                    "INSERT INTO audit_log (timestamp, username, pine_id, pine_script_name, operation, status, "
+                    "details, actor) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (log.timestamp.isoformat(), log.username, log.pine_id, log.pine_script_name, log.operation,
+                     log.status, log.details, getattr(log, 'actor', 'system')))
+        except sqlite3.OperationalError as e:
+            # Most likely a SQLite build without FTS5; the rest of the app carries on without search
+            logger.error("Disabling audit search index: %s", e)
+            self.enabled = False
+
+    @staticmethod
+    def _rowid_range(conn, since, until):
+        """Translate a time range into a rowid range via the timestamp index (None when nothing is in range)"""
+        low, high = 0, 2 ** 63 - 1
+        if since:
+            row = conn.execute("SELECT id FROM audit_log WHERE timestamp >= ? ORDER BY timestamp LIMIT 1",
+                               (since.isoformat(),)).fetchone()
+            if row is None:
+                return None
+            low = row[0]
+        if until:
+            row = conn.execute("SELECT id FROM audit_log WHERE timestamp < ? ORDER BY timestamp DESC LIMIT 1",
+                               (until.isoformat(),)).fetchone()
+            if row is None:
+                return None
+            high = row[0]
+        return low, high
+
+    def search(self, query='', username='', since=None, until=None, page=1, per_page=50, **filters):
+        """Return {"results", "total", "page", "per_page"}; ranked by relevance with a query, newest first without"""
+        per_page = max(1, min(per_page, MAX_PER_PAGE))
+        page = max(1, page)
+        offset = (page - 1) * per_page
+        with self._db() as conn:
+            id_range = self._rowid_range(conn, since, until)
+            if id_range is None:
+                return {"results": [], "total": 0, "page": page, "per_page": per_page}
+            match = build_match(query, username, **filters)
+            columns = ', '.join(f"l.{column}" for column in COLUMNS)
+            # The rowid range is exact for time-ordered inserts; the timestamp check covers clock skew between workers
+            exact = " AND l.timestamp >= ? AND l.timestamp < ?"
+            bounds = ((since or datetime.min).isoformat(), (until or datetime.max).isoformat())
+
+            if match is None:
+                total = conn.execute("SELECT COUNT(*) FROM audit_log WHERE id BETWEEN ? AND ?", id_range).fetchone()[0]
+                rows = conn.execute(
+                    f"SELECT {columns}, NULL FROM audit_log AS l WHERE l.id BETWEEN ? AND ?{exact} "
+                    f"ORDER BY l.id DESC LIMIT ? OFFSET ?",
+                    id_range + bounds + (per_page, offset)).fetchall()
+            else:
+                total = conn.execute("SELECT COUNT(*) FROM audit_fts WHERE audit_fts MATCH ? AND rowid BETWEEN ? AND ?",
+                                     (match,) + id_range).fetchone()[0]
+                # Only the newest matches are scored; ranking every match of a common term would take seconds
+                order = "m.score, l.id DESC" if query.strip() else "l.id DESC"
+                rows = conn.execute(
+                    f"WITH m AS (SELECT rowid AS id, bm25(audit_fts, 5.0, 2.0, 1.0, 0.0, 0.0, 0.0) AS score, "
+                    f"snippet(audit_fts, 2, '[', ']', '...', 12) AS snippet FROM audit_fts "
+                    f"WHERE audit_fts MATCH ? AND rowid BETWEEN ? AND ? ORDER BY rowid DESC LIMIT ?) "
+                    f"SELECT {columns}, m.snippet FROM m JOIN audit_log AS l ON l.id = m.id WHERE 1{exact} "
+                    f"ORDER BY {order} LIMIT ? OFFSET ?",
+                    (match,) + id_range + (max(Config.AUDIT_SEARCH_WINDOW, offset + per_page),) + bounds
+                    + (per_page, offset)).fetchall()
+
+        results = []
+        for row in rows:
+            result = dict(zip(COLUMNS, row))
+            result['timestamp'] = datetime.fromisoformat(result['timestamp'])
+            result['snippet'] = row[-1] if query.strip() else None
+            results.append(result)
+        return {"results": results, "total": total, "page": page, "per_page": per_page}
+
+    def clear(self):
+        with self._db() as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM audit_log")
+            conn.execute("INSERT INTO audit_fts (audit_fts) VALUES ('delete-all')")
+
+    def count(self):
+        if not self.enabled:
+            return 0
+        with self._db() as conn:
+            return conn.execute("SELECT COUNT(*) FROM audit_log").fetchone()[0]
+
+# Global audit search index, fed by AccessLog.create
+audit_search = AuditSearchIndex()
@@ -0,0 +1,122 @@
+"""Concurrent-request throughput of the app under different gunicorn worker classes.
+
+Starts the local TradingView stand-in with a fixed upstream latency, then
+for each worker class runs `gunicorn main:app` with one worker and fires
+concurrent /api/validate-username requests at it:
+
+    python benchmarks/concurrency.py --worker-classes sync,gevent --requests 200 --concurrency 50
+
+Results are printed and written as JSON (default benchmarks/concurrency_results.json).
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_tradingview import run_in_thread  # noqa: E402
+
+ADMIN_KEY = 'benchmark-admin-key'
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_for_port(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def run_worker_class(worker_class, upstream_url, upstream, args):
+    port = free_port()
+    env = dict(os.environ, **{
+        'PORT': str(port),
+        'GUNICORN_WORKER_CLASS': worker_class,
+        'WEB_CONCURRENCY': '1',
+        'TRADINGVIEW_BASE_URL': upstream_url,
+        'TRADINGVIEW_USERNAME': upstream.state.username,
+        'TRADINGVIEW_PASSWORD': upstream.state.password,
+        'TRADINGVIEW_SESSION_FILE': os.path.join(ROOT, 'instance', f'bench_{worker_class}_session.txt'),
+        'METRICS_MULTIPROC_DIR': os.path.join(ROOT, 'instance', f'bench_{worker_class}_metrics'),
+        'ADMIN_KEY': ADMIN_KEY,
+        'LOG_LEVEL': 'WARNING',
+    })
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--timeout', '120', 'main:app'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(port):
+            raise RuntimeError(f"gunicorn ({worker_class}) did not start")
+
+        base = f"http://127.0.0.1:{port}"
+        login = requests.Session()
+        login.post(f"{base}/admin_login", data={'login_key': ADMIN_KEY}, allow_redirects=False)
+        cookies = login.cookies.get_dict()
+
+        def call(i):
+            start = time.perf_counter()
+            response = requests.post(f"{base}/api/validate-username", json={'username': f"user{i % 50:06d}"},
+                                     cookies=cookies, timeout=120)
+            return time.perf_counter() - start, response.status_code == 200 and response.json().get('success')
+
+        call(0)  # Authenticate the worker against the stand-in before timing
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            outcomes = list(executor.map(call, range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(latency for latency, _ in outcomes)
+        return {
+            "worker_class": worker_class,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seconds": elapsed,
+            "throughput_rps": args.requests / elapsed,
+            "p50_latency": latencies[len(latencies) // 2],
+            "p95_latency": latencies[int(len(latencies) * 0.95) - 1],
+            "succeeded": sum(1 for _, ok in outcomes if ok)
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure concurrent-request throughput per gunicorn worker class")
+    parser.add_argument('--worker-classes', default='sync,gevent')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.05, help="Stand-in latency per upstream call")
+    parser.add_argument('--output', default=os.path.join(ROOT, 'benchmarks', 'concurrency_results.json'))
+    args = parser.parse_args()
+
+    upstream, upstream_url = run_in_thread(host='127.0.0.1', latency=args.latency, seed_users=50)
+    upstream.state.script_users('PUB;bench')  # Seeds the usernames the hint endpoint knows about
+
+    results = []
+    for worker_class in [name for name in args.worker_classes.split(',') if name]:
+        result = run_worker_class(worker_class, upstream_url, upstream, args)
+        results.append(result)
+        print(f"{worker_class:10s} {result['throughput_rps']:8.1f} req/s  p50 {result['p50_latency'] * 1000:.0f} ms  "
+              f"p95 {result['p95_latency'] * 1000:.0f} ms  ok {result['succeeded']}/{result['requests']}")
+
+    with open(args.output, 'w') as f:
+        json.dump({"timestamp": datetime.now().isoformat(), "upstream_latency": args.latency, "results": results},
+                  f, indent=2)
+    upstream.shutdown()
+
+if __name__ == "__main__":
+    main()
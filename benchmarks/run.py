@@ -0,0 +1,298 @@
+"""Benchmark suite for the Flask routes and TradingViewAPI hot paths.
+
+Runs against the Flask test client with the local TradingView stand-in
+(fake_tradingview.py) as upstream, so no network access is needed:
+
+    python benchmarks/run.py                       # full suite
+    python benchmarks/run.py --quick               # smaller sizes, for CI
+    python benchmarks/run.py --only index,export   # subset by name prefix
+
+Results are written as JSON (default benchmarks/results.json). Every
+benchmark's median is checked against benchmarks/thresholds.json and,
+with --baseline, against a previous results file; the exit code is 1 when
+any check regresses.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_tradingview import run_in_thread  # noqa: E402
+
+# The app reads its upstream settings at import time, so start the stand-in first
+upstream, upstream_url = run_in_thread()
+os.environ.update({
+    'TRADINGVIEW_BASE_URL': upstream_url,
+    'TRADINGVIEW_USERNAME': upstream.state.username,
+    'TRADINGVIEW_PASSWORD': upstream.state.password,
+    'TRADINGVIEW_SESSION_FILE': os.path.join(ROOT, 'instance', 'bench_session.txt'),
+    'AUDIT_SEARCH_DB': os.path.join(ROOT, 'instance', 'bench_audit.sqlite3'),
+    'LOG_LEVEL': os.getenv('LOG_LEVEL', 'WARNING'),
+    # The stand-in has no upstream limit to protect; measure the app rather than the pacing
+    'TRADINGVIEW_RATE_LIMIT': os.getenv('TRADINGVIEW_RATE_LIMIT', '0'),
+})
+
+from app import app  # noqa: E402
+import models  # noqa: E402
+from models import AccessLog, PineScript  # noqa: E402
+import routes  # noqa: E402
+from audit_search import audit_search  # noqa: E402
+
+BENCHMARKS = []
+
+def benchmark(name, repeat=5):
+    """Register a benchmark; the function returns a callable to time"""
+    def decorator(func):
+        BENCHMARKS.append((name, func, repeat))
+        return func
+    return decorator
+
+def reset_state(seed_users=0):
+    """Clear in-memory models and upstream grants between benchmarks"""
+    models.access_logs.clear()
+    models.pine_scripts.clear()
+    audit_search.clear()
+    upstream.state.reset()
+    upstream.state.seed_users = seed_users
+
+def admin_client():
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['admin_authenticated'] = True
+    return client
+
+def seed_logs(count):
+    for i in range(count):
+        AccessLog.create(f"user{i % 5000}", f"PUB;{i % 16}", f"Script {i % 16}",
+                         'grant' if i % 4 else 'remove', 'success' if i % 7 else 'failure',
+                         f"Duration: 1L, benchmark entry {i}")
+
+def seed_scripts(count):
+    for i in range(count):
+        PineScript.create(f"PUB;bench{i:06d}", f"Bench script {i}", f"Benchmark script {i}", True)
+
+# ----- benchmarks -----
+
+def make_index_benchmark(log_count):
+    def setup():
+        reset_state()
+        seed_logs(log_count)
+        client = admin_client()
+        return lambda: client.get('/')
+    return setup
+
+def make_audit_search_benchmark(log_count, query):
+    def setup():
+        reset_state()
+        seed_logs(log_count)
+        client = admin_client()
+        return lambda: client.get(f'/api/access-logs/search?{query}')
+    return setup
+
+def make_agent_scripts_benchmark(script_count):
+    def setup():
+        reset_state()
+        seed_scripts(script_count)
+        client = app.test_client()
+        return lambda: client.get('/api/get-agent-scripts')
+    return setup
+
+def make_script_users_benchmark(user_count):
+    def setup():
+        reset_state(seed_users=user_count)
+        return lambda: routes.tv_api.get_script_users('PUB;bench')
+    return setup
+
+def make_auth_probe_benchmark():
+    def setup():
+        reset_state()
+        client = routes.tv_api.get().default
+
+        def run():
+            client._auth_verified_at = None  # Force a real probe instead of the cached result
+            return client._ensure_authenticated()
+        return run
+    return setup
+
+def make_bulk_grant_benchmark(grant_count, concurrency, duration):
+    def setup():
+        reset_state()
+        seed_scripts(4)
+        pine_ids = [script.pine_id for script in PineScript.get_all()]
+        client = admin_client()
+
+        def grant(i):
+            return client.post('/api/grant-access', json={
+                'username': f"bulkuser{i}", 'scripts': pine_ids, 'duration': duration
+            })
+
+        def run():
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(grant, range(grant_count)))
+        return run
+    return setup
+
+def make_bulk_remove_benchmark(user_count, concurrency):
+    def setup():
+        reset_state(seed_users=user_count)
+        client = admin_client()
+        usernames = [f"user{i:06d}" for i in range(user_count)]
+        batches = [usernames[i::concurrency] for i in range(concurrency)]
+
+        def remove(batch):
+            return client.post('/api/bulk-remove-access', json={'usernames': batch, 'script_id': 'PUB;bench'})
+
+        def run():
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(remove, batches))
+        return run
+    return setup
+
+def make_export_benchmark(user_count):
+    def setup():
+        reset_state(seed_users=user_count)
+        client = admin_client()
+        return lambda: client.get('/api/export-script-users/PUB;bench')
+    return setup
+
+def make_startup_benchmark(warm_up):
+    """Cold start: import the app in a fresh interpreter and serve the first request"""
+    code = ("import time; start = time.perf_counter(); from app import app; "
+            "client = app.test_client(); client.get('/admin_login'); "
+            "print(time.perf_counter() - start)")
+
+    def setup():
+        env = dict(os.environ, WARMUP_ON_START='true' if warm_up else 'false')
+
+        def run():
+            subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return run
+    return setup
+
+def register(quick):
+    log_sizes = [1000, 10000] if quick else [10000, 100000]
+    catalog_sizes = [100, 1000] if quick else [1000, 10000]
+    user_sizes = [200, 1000] if quick else [1000, 10000]
+    concurrency_levels = [1, 4] if quick else [1, 4, 16]
+
+    benchmark("startup.cold_start", repeat=3)(make_startup_benchmark(False))
+    benchmark("startup.cold_start_with_warm_up", repeat=3)(make_startup_benchmark(True))
+    for size in log_sizes:
+        benchmark(f"index.render.logs_{size}")(make_index_benchmark(size))
+    for size in log_sizes:
+        benchmark(f"api.search_access_logs.broad.logs_{size}")(make_audit_search_benchmark(size, 'q=benchmark'))
+        benchmark(f"api.search_access_logs.filtered.logs_{size}")(
+            make_audit_search_benchmark(size, 'q=entry%204&username=user42&operation=grant'))
+    for size in catalog_sizes:
+        benchmark(f"api.get_agent_scripts.scripts_{size}")(make_agent_scripts_benchmark(size))
+    benchmark("tv.auth_probe", repeat=10)(make_auth_probe_benchmark())
+    for size in user_sizes:
+        benchmark(f"tv.get_script_users.users_{size}", repeat=1)(make_script_users_benchmark(size))
+    for level in concurrency_levels:
+        benchmark(f"api.grant_access.lifetime.concurrency_{level}", repeat=1)(
+            make_bulk_grant_benchmark(16, level, '1L'))
+        benchmark(f"api.grant_access.timed.concurrency_{level}", repeat=1)(
+            make_bulk_grant_benchmark(16, level, '30D'))
+        benchmark(f"api.bulk_remove.concurrency_{level}", repeat=1)(make_bulk_remove_benchmark(40, level))
+    for size in user_sizes:
+        benchmark(f"api.export_script_users.users_{size}", repeat=1)(make_export_benchmark(size))
+
+# ----- runner -----
+
+def run_benchmark(name, setup, repeat):
+    run = setup()
+    response = run()  # Warm-up, also authenticates against the stand-in
+    if getattr(response, 'status_code', 200) >= 400:
+        raise RuntimeError(f"{name} warm-up failed with HTTP {response.status_code}")
+    requests_before = sum(upstream.state.stats()['counters'].values())
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "name": name,
+        "repeat": repeat,
+        "min": samples[0],
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+        "max": samples[-1],
+        "upstream_requests_per_run": (sum(upstream.state.stats()['counters'].values()) - requests_before) / repeat
+    }
+
+def check_regressions(results, thresholds, baseline, tolerance):
+    """Return a list of human readable regression messages"""
+    failures = []
+    for result in results:
+        name = result['name']
+        limit = thresholds.get(name)
+        if limit is not None and result['median'] > limit:
+            failures.append(f"{name}: median {result['median']:.3f}s exceeds threshold {limit:.3f}s")
+        previous = baseline.get(name)
+        if previous is not None and result['median'] > previous * (1 + tolerance):
+            failures.append(f"{name}: median {result['median']:.3f}s is more than "
+                            f"{tolerance:.0%} slower than baseline {previous:.3f}s")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the performance benchmark suite")
+    parser.add_argument('--quick', action='store_true', help="Use smaller data sizes")
+    parser.add_argument('--only', default='', help="Comma separated benchmark name prefixes to run")
+    parser.add_argument('--output', default=os.path.join(ROOT, 'benchmarks', 'results.json'))
+    parser.add_argument('--thresholds', default=os.path.join(ROOT, 'benchmarks', 'thresholds.json'))
+    parser.add_argument('--baseline', default=None, help="Previous results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    register(args.quick)
+    prefixes = [prefix for prefix in args.only.split(',') if prefix]
+
+    results = []
+    for name, setup, repeat in BENCHMARKS:
+        if prefixes and not any(name.startswith(prefix) for prefix in prefixes):
+            continue
+        result = run_benchmark(name, setup, repeat)
+        results.append(result)
+        print(f"{name:55s} median {result['median'] * 1000:10.1f} ms  (min {result['min'] * 1000:.1f} ms)")
+
+    thresholds = {}
+    if os.path.exists(args.thresholds):
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {result['name']: result['median'] for result in json.load(f)['results']}
+
+    failures = check_regressions(results, thresholds, baseline, args.tolerance)
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "results": results,
+        "regressions": failures
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    upstream.shutdown()
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""WSGI response compression.
+
+Negotiates brotli (when the optional brotli package is installed) or gzip
+from Accept-Encoding for compressible content types. Responses with a
+known Content-Length below the size threshold, responses that are already
+encoded (e.g. precompressed assets) and no-transform responses are passed
+through untouched. The body is compressed chunk by chunk, so generator
+responses keep streaming.
+"""
+import zlib
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml'
+)
+
+class _GzipEncoder:
+    name = 'gzip'
+
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data, flush):
+        output = self._compressor.compress(data)
+        if flush:
+            output += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return output
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+class _BrotliEncoder:
+    name = 'br'
+
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data, flush):
+        output = self._compressor.process(data)
+        if flush:
+            output += self._compressor.flush()
+        return output
+
+    def finish(self):
+        return self._compressor.finish()
+
+def accepted_encodings(header):
+    """Parse Accept-Encoding into the set of encodings with a non-zero q value"""
+    accepted = set()
+    for part in header.lower().split(','):
+        pieces = part.strip().split(';')
+        name = pieces[0].strip()
+        quality = 1.0
+        for param in pieces[1:]:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            accepted.add(name)
+    return accepted
+
+class CompressionMiddleware:
+    """Compress eligible responses with brotli or gzip"""
+
+    def __init__(self, app, min_size=1024, level=6):
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+
+    def _choose_encoder(self, environ):
+        accepted = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in accepted:
+            return _BrotliEncoder(min(self.level, 11))
+        if 'gzip' in accepted or '*' in accepted:
+            return _GzipEncoder(self.level)
+        return None
+
+    def _should_compress(self, status, headers):
+        code = int(status.split(' ', 1)[0])
+        if code < 200 or code in (204, 206, 304):
+            return False
+        header_map = {name.lower(): value for name, value in headers}
+        if 'content-encoding' in header_map:
+            return False
+        if 'no-transform' in header_map.get('cache-control', '').lower():
+            return False
+        content_type = header_map.get('content-type', '').split(';')[0].strip().lower()
+        if content_type not in COMPRESSIBLE_TYPES:
+            return False
+        length = header_map.get('content-length')
+        if length is not None and length.isdigit() and int(length) < self.min_size:
+            return False
+        return True
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, start_response)
+
+        encoder = self._choose_encoder(environ)
+        if encoder is None:
+            return self.app(environ, start_response)
+
+        state = {'compress': False, 'streaming': False, 'returned': False}
+
+        def compressing_start_response(status, headers, exc_info=None):
+            # Apps that start the response lazily, after returning their body, are passed through
+            if not state['returned'] and self._should_compress(status, headers):
+                state['compress'] = True
+                state['streaming'] = not any(name.lower() == 'content-length' for name, _ in headers)
+                headers = [(name, value) for name, value in headers if name.lower() != 'content-length']
+                vary = [value for name, value in headers if name.lower() == 'vary']
+                headers = [(name, value) for name, value in headers if name.lower() != 'vary']
+                vary_values = [item.strip() for value in vary for item in value.split(',') if item.strip()]
+                if 'accept-encoding' not in (item.lower() for item in vary_values):
+                    vary_values.append('Accept-Encoding')
+                headers.append(('Vary', ', '.join(vary_values)))
+                headers.append(('Content-Encoding', encoder.name))
+            write = start_response(status, headers, exc_info)
+            if not state['compress']:
+                return write
+            return lambda data: write(encoder.compress(data, True))
+
+        body = self.app(environ, compressing_start_response)
+        state['returned'] = True
+        if not state['compress']:
+            return body
+        return self._compress_body(body, encoder, state['streaming'])
+
+    @staticmethod
+    def _compress_body(body, encoder, streaming):
+        try:
+            for chunk in body:
+                if not chunk:
+                    continue
+                # Flush per chunk only for streamed bodies so each piece reaches the client promptly
+                output = encoder.compress(chunk, streaming)
+                if output:
+                    yield output
+            yield encoder.finish()
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
@@ -0,0 +1,26 @@
+"""Detection of cooperative (green-thread) I/O mode.
+
+The app is written against the standard threading, time and socket APIs.
+Under gunicorn's gevent or eventlet workers those modules are monkeypatched
+before the app is imported (see gunicorn.conf.py), which makes every lock,
+sleep, thread and upstream HTTP call cooperative. The few places that
+depend on real OS threads check cooperative_mode() and adapt.
+"""
+
+def cooperative_mode():
+    """Return 'gevent' or 'eventlet' when the socket module is monkeypatched, else None"""
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('socket'):
+            return 'gevent'
+    except ImportError:
+        pass
+
+    try:
+        from eventlet import patcher
+        if patcher.is_monkey_patched('socket'):
+            return 'eventlet'
+    except ImportError:
+        pass
+
+    return None
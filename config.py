@@ -12,13 +12,108 @@ class Config:
     SESSION_TIMEOUT = int(os.getenv("SESSION_TIMEOUT", "3600"))  # 1 hour default
     
     # API configuration
-    TRADINGVIEW_BASE_URL = "https://www.tradingview.com"
+    # Point at a local stand-in (see fake_tradingview.py) with e.g. TRADINGVIEW_BASE_URL=http://127.0.0.1:5055
+    TRADINGVIEW_BASE_URL = os.getenv("TRADINGVIEW_BASE_URL", "https://www.tradingview.com").rstrip("/")
+    TRADINGVIEW_SESSION_FILE = os.getenv("TRADINGVIEW_SESSION_FILE", "session.txt")
+    TRADINGVIEW_MAX_WORKERS = int(os.getenv("TRADINGVIEW_MAX_WORKERS", "8"))  # Concurrent upstream calls
+    TRADINGVIEW_AUTH_PROBE_TTL = int(os.getenv("TRADINGVIEW_AUTH_PROBE_TTL", "60"))  # Seconds a verified session is trusted
+    # Extra owner accounts as a JSON list (inline or a file path) of
+    # {"name", "username", "password" or "password_env", "pine_ids", optional "rate_limit", "rate_burst", "concurrency", "session_file"}
+    TRADINGVIEW_ACCOUNTS = os.getenv("TRADINGVIEW_ACCOUNTS", "")
+    TRADINGVIEW_RATE_LIMIT = float(os.getenv("TRADINGVIEW_RATE_LIMIT", "5"))  # Upstream requests/second per account, 0 = unlimited
+    TRADINGVIEW_RATE_BURST = int(os.getenv("TRADINGVIEW_RATE_BURST", "5"))
+    UPSTREAM_CONCURRENCY = int(os.getenv("UPSTREAM_CONCURRENCY", "8"))  # Upstream calls in flight per account, shared fairly across sessions
+    UPSTREAM_FLOW_WEIGHTS = os.getenv("UPSTREAM_FLOW_WEIGHTS", "admin:2,agent:1,system:1")  # Share of upstream slots per session, by actor
+    AGENT_QUOTA_GRANTS = int(os.getenv("AGENT_QUOTA_GRANTS", "0"))  # Script grants per agent session per window, 0 = unlimited
+    AGENT_QUOTA_WINDOW = int(os.getenv("AGENT_QUOTA_WINDOW", "3600"))  # Seconds
+    AGENT_QUOTA_CONCURRENT = int(os.getenv("AGENT_QUOTA_CONCURRENT", "0"))  # Grant requests in flight per agent session, 0 = unlimited
+    SINGLE_FLIGHT_TIMEOUT = int(os.getenv("SINGLE_FLIGHT_TIMEOUT", "120"))  # Seconds to wait on a shared in-flight read
+    COOPERATIVE_POOL_SIZE = int(os.getenv("COOPERATIVE_POOL_SIZE", "50"))  # Upstream connections per gevent/eventlet worker
+    
+    # User access index configuration
+    USER_INDEX_TTL = int(os.getenv("USER_INDEX_TTL", "900"))  # 15 minutes default
+    
+    # Script user list snapshots (shared by the users modal, export and bulk removal)
+    USER_SNAPSHOT_TTL = int(os.getenv("USER_SNAPSHOT_TTL", "600"))  # 10 minutes default
+    USER_SNAPSHOT_MAX = int(os.getenv("USER_SNAPSHOT_MAX", "32"))  # Snapshots kept at most
     
     # Default Pine IDs (can be configured via environment)
     DEFAULT_PINE_IDS = os.getenv("DEFAULT_PINE_IDS", "").split(",") if os.getenv("DEFAULT_PINE_IDS") else []
+    # Default catalog seeded once at app init ([{"name": ..., "pine_id": ...}, ...])
+    DEFAULT_SCRIPTS_FILE = os.getenv("DEFAULT_SCRIPTS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "default_scripts.json"))
+    
+    # Startup warm-up (runs in a background thread after app init)
+    WARMUP_ON_START = os.getenv("WARMUP_ON_START", "false").lower() == "true"
+    WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "2"))  # Upstream connections to pre-open
+    WARMUP_PREFETCH_CATALOG = os.getenv("WARMUP_PREFETCH_CATALOG", "false").lower() == "true"  # Fill the user index
+    
+    # Static assets: fingerprint and precompress at start-up (or run `python assets.py` at build time)
+    ASSET_BUILD_ON_START = os.getenv("ASSET_BUILD_ON_START", "true").lower() == "true"
+    
+    # Response compression (gzip, or brotli when installed)
+    COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # Bytes; smaller responses are left alone
+    COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+    
+    # Purge of expired and blocked grants (see purge.py)
+    PURGE_ENABLED = os.getenv("PURGE_ENABLED", "false").lower() == "true"  # Run scheduled sweeps
+    PURGE_DRY_RUN = os.getenv("PURGE_DRY_RUN", "true").lower() == "true"  # Only report what would be removed
+    PURGE_INTERVAL = int(os.getenv("PURGE_INTERVAL", "21600"))  # Seconds between sweeps (6 hours)
+    PURGE_GRACE_HOURS = int(os.getenv("PURGE_GRACE_HOURS", "24"))  # Keep expired grants this long before removal
+    PURGE_BLOCKED_USERS = os.getenv("PURGE_BLOCKED_USERS", "")  # Comma-separated usernames removed from every script
+    PURGE_PARALLEL_SCRIPTS = int(os.getenv("PURGE_PARALLEL_SCRIPTS", "2"))  # Scripts swept concurrently
+    PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "50"))  # Removals per batch
+    PURGE_BATCH_PAUSE = float(os.getenv("PURGE_BATCH_PAUSE", "5"))  # Seconds between batches
+    PURGE_CHECKPOINT_FILE = os.getenv("PURGE_CHECKPOINT_FILE", "instance/purge/checkpoint.json")
+    
+    # Outbox of access change events for downstream systems (see outbox.py)
+    OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "false").lower() == "true"
+    OUTBOX_DIR = os.getenv("OUTBOX_DIR", "instance/outbox")
+    OUTBOX_SINKS = os.getenv("OUTBOX_SINKS", "")  # e.g. "webhook:https://...,file:path,socket:/path.sock"
+    OUTBOX_WEBHOOK_SECRET = os.getenv("OUTBOX_WEBHOOK_SECRET", "")  # HMAC-SHA256 signs webhook bodies when set
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))  # Events per delivery
+    OUTBOX_FLUSH_INTERVAL = float(os.getenv("OUTBOX_FLUSH_INTERVAL", "1"))  # Seconds between dispatcher passes
+    OUTBOX_MAX_RETRIES = int(os.getenv("OUTBOX_MAX_RETRIES", "8"))  # Failed attempts before dead-lettering a batch
+    OUTBOX_COMPACT_BYTES = int(os.getenv("OUTBOX_COMPACT_BYTES", str(1024 * 1024)))  # Truncate delivered journals past this
+    
+    # Durable queue of grants and removals made while TradingView is unavailable (see pending_operations.py)
+    PENDING_QUEUE_ENABLED = os.getenv("PENDING_QUEUE_ENABLED", "false").lower() == "true"
+    PENDING_QUEUE_FILE = os.getenv("PENDING_QUEUE_FILE", "instance/pending/queue.sqlite3")
+    PENDING_DRAIN_INTERVAL = float(os.getenv("PENDING_DRAIN_INTERVAL", "10"))  # Seconds between drain passes
+    PENDING_MAX_ATTEMPTS = int(os.getenv("PENDING_MAX_ATTEMPTS", "20"))  # Transient failures before an intent fails
+    PENDING_BACKOFF_MAX = float(os.getenv("PENDING_BACKOFF_MAX", "300"))  # Longest wait between attempts, seconds
+    PENDING_UPSTREAM_COOLDOWN = float(os.getenv("PENDING_UPSTREAM_COOLDOWN", "30"))  # Queue without calling TradingView this long after a transient failure
+    
+    # Full-text search over the access audit trail (see audit_search.py)
+    AUDIT_SEARCH_ENABLED = os.getenv("AUDIT_SEARCH_ENABLED", "true").lower() == "true"
+    AUDIT_SEARCH_DB = os.getenv("AUDIT_SEARCH_DB", "instance/audit/search.sqlite3")  # ":memory:" keeps it per process
+    AUDIT_SEARCH_WINDOW = int(os.getenv("AUDIT_SEARCH_WINDOW", "1000"))  # Newest matches ranked per search
+    
+    # Dashboard configuration
+    DASHBOARD_PAGE_SIZE = int(os.getenv("DASHBOARD_PAGE_SIZE", "50"))  # Scripts per dashboard page
+    STATS_HOURLY_BUCKETS = int(os.getenv("STATS_HOURLY_BUCKETS", "168"))  # Hourly activity buckets kept (7 days)
+    STATS_DAILY_BUCKETS = int(os.getenv("STATS_DAILY_BUCKETS", "90"))  # Daily activity buckets kept
+    
+    # Metrics configuration
+    METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")  # Shared snapshot dir for gunicorn workers
+    METRICS_FLUSH_INTERVAL = int(os.getenv("METRICS_FLUSH_INTERVAL", "5"))  # Seconds between worker snapshots
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # Optional bearer token required by /metrics
+    
+    # Tracing configuration
+    TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"  # Server-Timing header on every response
+    TRACE_SLOW_THRESHOLD_MS = int(os.getenv("TRACE_SLOW_THRESHOLD_MS", "2000"))  # Export traces slower than this
+    TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "instance/traces/slow_traces.jsonl")  # Empty disables export
+    TRACE_EXPORT_MAX_BYTES = int(os.getenv("TRACE_EXPORT_MAX_BYTES", str(10 * 1024 * 1024)))
+    
+    # Profiling configuration (admin requests with X-Profile header or ?profile= flag)
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "instance/profiles")
+    PROFILE_RETENTION = int(os.getenv("PROFILE_RETENTION", "50"))  # Newest profiles kept on disk
+    PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))  # Seconds between samples
     
     # Logging configuration
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" or "json"
+    LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "10"))  # Keep 1 in N high-frequency per-item events
     
     # Replit deployment configuration
     PORT = int(os.getenv("PORT", "5000"))
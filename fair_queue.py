@@ -0,0 +1,99 @@
+"""Weighted fair queuing of upstream TradingView calls across sessions.
+
+Every request runs in a flow named after its session ("agent:<client id>",
+"admin:<client id>"; background jobs are "system"). Each account allows
+UPSTREAM_CONCURRENCY calls at a time. When they are all busy, waiting calls
+are admitted in start-time fair queuing order: a call's tag is the later of
+the current virtual time and its flow's previous tag, plus 1/weight. A
+session with a large batch queued therefore cannot starve one that just
+sent a single grant; the newcomer is admitted as soon as a slot frees.
+Weights per actor come from UPSTREAM_FLOW_WEIGHTS.
+"""
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+import metrics
+
+_current_flow = contextvars.ContextVar('upstream_flow', default=("system", 1.0))
+
+def parse_weights(value):
+    """Parse "admin:4,agent:1,system:1" into {"admin": 4.0, ...}"""
+    weights = {}
+    for item in value.split(','):
+        actor, _, weight = item.strip().partition(':')
+        if actor and weight:
+            weights[actor] = max(0.01, float(weight))
+    return weights
+
+FLOW_WEIGHTS = parse_weights(Config.UPSTREAM_FLOW_WEIGHTS)
+
+def enter_flow(actor, client_id):
+    """Make upstream calls of the current request (and its executor tasks) part of a session's flow"""
+    name = f"{actor}:{client_id}" if client_id else actor
+    return _current_flow.set((name, FLOW_WEIGHTS.get(actor, 1.0)))
+
+def exit_flow(token):
+    _current_flow.reset(token)
+
+def current_flow():
+    return _current_flow.get()
+
+class FairScheduler:
+    """Admits a bounded number of concurrent calls, in weighted fair order across flows"""
+
+    def __init__(self, slots, name="default"):
+        self.slots = max(1, slots)
+        self.name = name
+        self._free = self.slots
+        self._virtual_time = 0.0
+        self._finish = {}  # flow -> tag of its latest call
+        self._waiting = []  # heap of (tag, arrival, flow, event)
+        self._arrivals = itertools.count()
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        flow, weight = _current_flow.get()
+        with self._lock:
+            tag = max(self._virtual_time, self._finish.get(flow, 0.0))
+            self._finish[flow] = tag + 1.0 / weight
+            if self._free > 0 and not self._waiting:
+                self._free -= 1
+                self._virtual_time = tag
+                return
+            event = threading.Event()
+            heapq.heappush(self._waiting, (tag, next(self._arrivals), flow, event))
+
+        start = time.perf_counter()
+        event.wait()
+        metrics.upstream_queue_wait_seconds_total.inc(time.perf_counter() - start, flow=flow.split(':', 1)[0])
+
+    def _release(self):
+        with self._lock:
+            if self._waiting:
+                tag, _, _, event = heapq.heappop(self._waiting)
+                self._virtual_time = tag
+                event.set()  # The slot passes straight to the next flow in fair order
+            else:
+                self._free += 1
+            if len(self._finish) > 1000:
+                # Flows whose tags the virtual time has passed would start from it anyway
+                self._finish = {flow: tag for flow, tag in self._finish.items() if tag > self._virtual_time}
+
+    @contextmanager
+    def slot(self):
+        self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self):
+        with self._lock:
+            waiting = {}
+            for _, _, flow, _ in self._waiting:
+                waiting[flow] = waiting.get(flow, 0) + 1
+            return {"account": self.name, "slots": self.slots, "busy": self.slots - self._free, "waiting": waiting}
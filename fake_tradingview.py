@@ -0,0 +1,330 @@
+"""Local TradingView stand-in server for offline load and integration testing.
+
+Implements the subset of tradingview.com that TradingViewAPI talks to
+(/accounts/signin/, /chart/, /username_hint/ and
+/pine_perm/add|remove|list_users|modify_user_expiration/)
+with the same multipart/cookie semantics, plus configurable latency,
+pagination, 429 rate limiting and session expiry.
+
+Run it with:
+
+    python fake_tradingview.py --port 5055 --latency 0.05 --seed-users 1000
+
+and point the app at it with TRADINGVIEW_BASE_URL=http://127.0.0.1:5055.
+"""
+import argparse
+import logging
+import random
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import Flask, request, jsonify, make_response, redirect
+
+logger = logging.getLogger(__name__)
+
+class FakeTradingView:
+    """In-memory state of the stand-in server"""
+
+    def __init__(self, username="fakeuser", password="fakepass", latency=0.0, jitter=0.0,
+                 session_ttl=3600, rate_limit=0, rate_burst=None, seed_users=0, chart_size=200000):
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.jitter = jitter
+        self.session_ttl = session_ttl
+        self.rate_limit = rate_limit  # Requests per second per client, 0 disables limiting
+        self.rate_burst = rate_burst if rate_burst is not None else max(1, int(rate_limit))
+        self.seed_users = seed_users
+        self.chart_size = chart_size
+        self.reset()
+
+    def reset(self):
+        """Drop all sessions, grants and counters"""
+        self._lock = threading.Lock()
+        self.sessions = {}  # sessionid -> expiry timestamp
+        self.csrf_tokens = set()
+        self.permissions = {}  # pine_id -> {username_lower: {"username", "expiration", "created"}}
+        self.known_users = set()
+        self.buckets = {}  # client key -> (tokens, last refill)
+        self.counters = {}
+        self.bytes_sent = 0
+
+    # ----- helpers -----
+
+    def count(self, name, size=0):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+            self.bytes_sent += size
+
+    def sleep(self):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def allow(self, client):
+        """Token bucket check; False means the request gets a 429"""
+        if not self.rate_limit:
+            return True
+        now = time.time()
+        with self._lock:
+            tokens, last = self.buckets.get(client, (self.rate_burst, now))
+            tokens = min(self.rate_burst, tokens + (now - last) * self.rate_limit)
+            if tokens < 1:
+                self.buckets[client] = (tokens, now)
+                return False
+            self.buckets[client] = (tokens - 1, now)
+            return True
+
+    def new_session(self):
+        sessionid = secrets.token_hex(16)
+        with self._lock:
+            self.sessions[sessionid] = time.time() + self.session_ttl
+        return sessionid
+
+    def is_valid_session(self, sessionid):
+        with self._lock:
+            expiry = self.sessions.get(sessionid)
+            if expiry is None:
+                return False
+            if expiry < time.time():
+                del self.sessions[sessionid]
+                return False
+            return True
+
+    def expire_sessions(self):
+        """Invalidate every session, forcing clients to sign in again"""
+        with self._lock:
+            self.sessions.clear()
+
+    def script_users(self, pine_id):
+        """Return the grant table of a script, seeding it on first use"""
+        with self._lock:
+            users = self.permissions.get(pine_id)
+            if users is None:
+                users = {}
+                now = datetime.now()
+                for i in range(self.seed_users):
+                    username = f"user{i:06d}"
+                    users[username] = {
+                        "username": username,
+                        "expiration": None if i % 3 == 0 else (now + timedelta(days=(i % 60) - 10)).strftime('%Y-%m-%dT%H:%M:%S'),
+                        "created": (now - timedelta(minutes=i)).strftime('%Y-%m-%dT%H:%M:%S')
+                    }
+                    self.known_users.add(username)
+                self.permissions[pine_id] = users
+            return users
+
+    def stats(self):
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "bytes_sent": self.bytes_sent,
+                "sessions": len(self.sessions),
+                "scripts": {pine_id: len(users) for pine_id, users in self.permissions.items()}
+            }
+
+def create_fake_app(state=None, **options):
+    """Build the stand-in Flask app around a FakeTradingView state"""
+    state = state or FakeTradingView(**options)
+    fake = Flask(__name__)
+    fake.config['FAKE_STATE'] = state
+
+    def client_key():
+        return request.cookies.get('sessionid') or request.remote_addr
+
+    def authorized():
+        return state.is_valid_session(request.cookies.get('sessionid', ''))
+
+    @fake.before_request
+    def simulate_upstream():
+        if request.path.startswith('/__fake__/'):
+            return None
+        state.sleep()
+        if not state.allow(client_key()):
+            state.count('429')
+            return make_response(jsonify({"detail": "Too many requests"}), 429, {'Retry-After': '1'})
+        return None
+
+    @fake.after_request
+    def record(response):
+        if not request.path.startswith('/__fake__/'):
+            size = response.calculate_content_length() or 0
+            state.count(f"{request.method} {request.path}", size)
+        return response
+
+    @fake.route('/accounts/signin/', methods=['GET', 'POST'])
+    def signin():
+        if request.method == 'GET':
+            token = secrets.token_hex(16)
+            state.csrf_tokens.add(token)
+            html = (f'<html><head><script>window._csrf = "{token}";</script></head><body>'
+                    f'<form method="post"><input type="hidden" name="authenticity_token" value="{token}">'
+                    '</form></body></html>')
+            response = make_response(html)
+            response.set_cookie('csrftoken', token)
+            return response
+
+        if request.form.get('username') == state.username and request.form.get('password') == state.password:
+            response = redirect(request.form.get('return_to', '/'), 302)
+            response.set_cookie('sessionid', state.new_session(), httponly=True)
+            return response
+        return jsonify({"error": "Invalid username or password"})
+
+    @fake.route('/chart/')
+    def chart():
+        if not authorized():
+            return redirect('/accounts/signin/?next=/chart/', 302)
+        token = secrets.token_hex(16)
+        head = f'<html><head><script>window.__csrfToken = "{token}";</script></head><body>'
+        padding = 'x' * max(0, state.chart_size - len(head))
+        return make_response(head + f'<!-- {padding} --></body></html>')
+
+    @fake.route('/')
+    def home():
+        return make_response('<html><body>chart dashboard</body></html>')
+
+    @fake.route('/username_hint/')
+    def username_hint():
+        prefix = request.args.get('s', '').lower()
+        with state._lock:
+            matches = sorted(name for name in state.known_users if name.lower().startswith(prefix))
+        return jsonify([{"username": name} for name in matches[:20]])
+
+    @fake.route('/pine_perm/add/', methods=['POST'])
+    def pine_perm_add():
+        if not authorized():
+            return jsonify({"detail": "Authentication credentials were not provided."}), 403
+        pine_id = request.form.get('pine_id')
+        username = request.form.get('username_recip', '')
+        if not pine_id or not username:
+            return jsonify({"detail": "pine_id and username_recip are required"}), 400
+        users = state.script_users(pine_id)
+        with state._lock:
+            users[username.lower()] = {
+                "username": username,
+                "expiration": request.form.get('expiration') or None,
+                "created": datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+            }
+            state.known_users.add(username)
+        return jsonify({"status": "ok"})
+
+    @fake.route('/pine_perm/remove/', methods=['POST'])
+    def pine_perm_remove():
+        if not authorized():
+            return jsonify({"detail": "Authentication credentials were not provided."}), 403
+        pine_id = request.form.get('pine_id')
+        username = request.form.get('username_recip', '')
+        users = state.script_users(pine_id)
+        with state._lock:
+            users.pop(username.lower(), None)
+        return jsonify({"status": "ok"})
+
+    @fake.route('/pine_perm/modify_user_expiration/', methods=['POST'])
+    def pine_perm_modify_user_expiration():
+        if not authorized():
+            return jsonify({"detail": "Authentication credentials were not provided."}), 403
+        pine_id = request.form.get('pine_id')
+        username = request.form.get('username_recip', '')
+        if not pine_id or not username:
+            return jsonify({"detail": "pine_id and username_recip are required"}), 400
+        users = state.script_users(pine_id)
+        with state._lock:
+            user = users.get(username.lower())
+            if user is None:
+                return jsonify({"detail": "User has no access to this script"}), 404
+            user["expiration"] = request.form.get('expiration') or None
+        return jsonify({"status": "ok"})
+
+    @fake.route('/pine_perm/list_users/', methods=['POST'])
+    def pine_perm_list_users():
+        if not authorized():
+            return jsonify({"detail": "Authentication credentials were not provided."}), 403
+        pine_id = request.form.get('pine_id')
+        if not pine_id:
+            return jsonify({"detail": "pine_id is required"}), 400
+        limit = int(request.form.get('limit') or request.args.get('limit') or 10)
+        offset = int(request.form.get('offset') or request.args.get('offset') or 0)
+        username = request.form.get('username', '').lower()
+
+        users = state.script_users(pine_id)
+        with state._lock:
+            rows = sorted(users.values(), key=lambda user: user['created'], reverse=True)
+        if username:
+            rows = [user for user in rows if username in user['username'].lower()]
+
+        page = rows[offset:offset + limit]
+        has_next = offset + limit < len(rows)
+        return jsonify({
+            "results": page,
+            "count": len(rows),
+            "next": f"/pine_perm/list_users/?limit={limit}&offset={offset + limit}" if has_next else None
+        })
+
+    # ----- control endpoints for tests and benchmarks -----
+
+    @fake.route('/__fake__/stats')
+    def fake_stats():
+        return jsonify(state.stats())
+
+    @fake.route('/__fake__/reset', methods=['POST'])
+    def fake_reset():
+        state.reset()
+        return jsonify({"success": True})
+
+    @fake.route('/__fake__/expire-sessions', methods=['POST'])
+    def fake_expire_sessions():
+        state.expire_sessions()
+        return jsonify({"success": True})
+
+    @fake.route('/__fake__/config', methods=['POST'])
+    def fake_config():
+        for key, value in (request.get_json() or {}).items():
+            if key in ('latency', 'jitter', 'session_ttl', 'rate_limit', 'rate_burst', 'seed_users', 'chart_size'):
+                setattr(state, key, value)
+        return jsonify({"success": True})
+
+    return fake
+
+def run_in_thread(host="127.0.0.1", port=0, quiet=True, **options):
+    """Start the stand-in server on a background thread and return (server, base_url)"""
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    fake = create_fake_app(**options)
+    server = make_server(host, port, fake, threaded=True,
+                         request_handler=QuietRequestHandler if quiet else None)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.state = fake.config['FAKE_STATE']
+    return server, f"http://{host}:{server.server_port}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Local TradingView stand-in server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--username', default='fakeuser', help="Account username accepted by /accounts/signin/")
+    parser.add_argument('--password', default='fakepass', help="Account password accepted by /accounts/signin/")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every upstream request")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Extra random latency, up to this many seconds")
+    parser.add_argument('--session-ttl', type=int, default=3600, help="Seconds before a session expires")
+    parser.add_argument('--rate-limit', type=float, default=0, help="Requests per second per client before 429s")
+    parser.add_argument('--rate-burst', type=int, default=None, help="Token bucket size for rate limiting")
+    parser.add_argument('--seed-users', type=int, default=0, help="Users pre-granted on every script")
+    parser.add_argument('--chart-size', type=int, default=200000, help="Size of the /chart/ page in bytes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    fake = create_fake_app(
+        username=args.username, password=args.password, latency=args.latency, jitter=args.jitter,
+        session_ttl=args.session_ttl, rate_limit=args.rate_limit, rate_burst=args.rate_burst,
+        seed_users=args.seed_users, chart_size=args.chart_size
+    )
+    logger.info(f"Fake TradingView listening on http://{args.host}:{args.port}")
+    fake.run(host=args.host, port=args.port, threaded=True)
+
+if __name__ == "__main__":
+    main()
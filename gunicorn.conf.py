@@ -0,0 +1,35 @@
+"""Gunicorn configuration, picked up automatically by `gunicorn main:app`"""
+import os
+import shutil
+
+# GUNICORN_WORKER_CLASS=gevent (or eventlet) selects cooperative I/O: each worker
+# serves many requests at once while they wait on TradingView. Patching here,
+# before anything else is imported, keeps locks and sockets created at import
+# time cooperative even with --preload. Install the worker libraries with
+# `pip install ".[async]"` (or `uv sync --extra async`).
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+if worker_class == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+elif worker_class == "eventlet":
+    import eventlet
+    eventlet.monkey_patch()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+if worker_class in ("gevent", "eventlet"):
+    worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "200"))
+
+# Workers write metrics snapshots here so /metrics reports totals for the whole server
+os.environ.setdefault("METRICS_MULTIPROC_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "metrics"))
+
+def on_starting(server):
+    """Clear metrics snapshots left over from a previous server run"""
+    metrics_dir = os.environ["METRICS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+def worker_exit(server, worker):
+    """Write a final metrics snapshot so counters of exited workers are kept"""
+    import metrics
+    metrics.registry.flush()
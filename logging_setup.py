@@ -0,0 +1,96 @@
+"""Non-blocking logging pipeline.
+
+Records are handed to a QueueHandler on the calling thread and written by a
+QueueListener on a background thread, so log I/O never sits on the request
+path. High-frequency read and progress events (attempts, list pages) are
+logged with extra={'sample_key': ...} and only one in LOG_SAMPLE_EVERY of
+them per key is kept. Outcomes of access changes are never sampled: they
+are the operator's record of each grant and removal. LOG_FORMAT=json switches the output to one JSON object per line.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+
+class SamplingFilter(logging.Filter):
+    """Keep one in every N records that share a sample_key"""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(1, every)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, 'sample_key', None)
+        if key is None or self.every == 1:
+            return True
+        with self._lock:
+            count = self._counts.get(key, 0) + 1
+            self._counts[key] = count
+        if count % self.every != 1:
+            return False
+        record.sample_rate = self.every
+        return True
+
+class StructuredFormatter(logging.Formatter):
+    """Format records as JSON objects including any extra fields"""
+
+    def format(self, record):
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in data:
+                data[key] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data)
+
+def configure_logging(level="INFO", log_format="text", sample_every=10):
+    """Route the root logger through a queue drained by a background writer thread"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    if log_format == "json":
+        formatter = StructuredFormatter()
+    else:
+        formatter = logging.Formatter("%(levelname)s:%(name)s:%(message)s")
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_every))
+
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+def stop_logging():
+    """Flush queued records and stop the background writer"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
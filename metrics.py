@@ -0,0 +1,282 @@
+"""Prometheus-style metrics for request and upstream-call latency.
+
+Metrics live in process memory. When METRICS_MULTIPROC_DIR is set (the
+shipped gunicorn.conf.py does this) every worker periodically writes a
+snapshot of its metrics to <dir>/<pid>-<start>.json and /metrics merges all
+snapshots, so a scrape served by any worker reports totals for the whole
+server. Counters and histograms are summed over every snapshot, including
+those of exited workers; gauges only over workers that are still alive.
+<start> is the process start time (a random id where /proc is unavailable),
+so a worker that reuses a dead worker's pid never overwrites its snapshot.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class _Metric:
+    """Base class for a labelled metric family"""
+
+    type_name = None
+
+    def __init__(self, registry, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}  # label values tuple -> value
+        self._lock = registry.lock
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self.values.items()]
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    type_name = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = value
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, registry, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(registry, name, help_text, labelnames)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self.values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), list(value)] for key, value in self.values.items()]
+
+class MetricsRegistry:
+    """Holds metric families and renders them in the Prometheus text format"""
+
+    def __init__(self, multiproc_dir=None, flush_interval=5):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.multiproc_dir = multiproc_dir
+        self.flush_interval = flush_interval
+        self._flusher = None
+        self._flusher_pid = None
+        self._tag = None  # (pid, tag) of the process that computed it
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return Counter(self, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return Gauge(self, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return Histogram(self, name, help_text, labelnames, buckets)
+
+    # ----- multi-process support -----
+
+    @staticmethod
+    def _process_start(pid):
+        """Start time of a process in clock ticks since boot, or None without /proc"""
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                # The command name may contain spaces; fields after it are space separated
+                return f.read().rsplit(')', 1)[1].split()[19]
+        except (OSError, IndexError):
+            return None
+
+    def _snapshot_path(self):
+        pid = os.getpid()
+        if self._tag is None or self._tag[0] != pid:
+            self._tag = (pid, self._process_start(pid) or uuid.uuid4().hex)
+        return os.path.join(self.multiproc_dir, f"{pid}-{self._tag[1]}.json")
+
+    def flush(self):
+        """Write this process's metrics snapshot for other workers to merge"""
+        if not self.multiproc_dir:
+            return
+        try:
+            os.makedirs(self.multiproc_dir, exist_ok=True)
+            data = {name: metric.snapshot() for name, metric in self.metrics.items()}
+            path = self._snapshot_path()
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Error flushing metrics snapshot: {e}")
+
+    def start_flusher(self):
+        """Start the periodic snapshot writer once per process (safe after fork)"""
+        if not self.multiproc_dir or self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+
+        def run():
+            while True:
+                time.sleep(self.flush_interval)
+                self.flush()
+
+        self._flusher = threading.Thread(target=run, name="metrics-flusher", daemon=True)
+        self._flusher.start()
+
+    @classmethod
+    def _pid_alive(cls, pid, tag=None):
+        """Whether the process that wrote a snapshot tagged (pid, tag) is still running"""
+        try:
+            os.kill(pid, 0)
+        except (OSError, ValueError):
+            return False
+        start = cls._process_start(pid)
+        return start is None or tag is None or start == tag
+
+    def _collect(self):
+        """Return {name: {labels tuple: value}} merged across processes"""
+        if not self.multiproc_dir:
+            return {name: {tuple(key): value for key, value in metric.snapshot()}
+                    for name, metric in self.metrics.items()}
+
+        self.flush()
+        own = os.path.basename(self._snapshot_path())
+        merged = {name: {} for name in self.metrics}
+        try:
+            filenames = [name for name in os.listdir(self.multiproc_dir) if name.endswith('.json')]
+        except FileNotFoundError:
+            filenames = []
+
+        for filename in filenames:
+            pid, _, tag = filename[:-5].partition('-')
+            try:
+                pid = int(pid)
+                with open(os.path.join(self.multiproc_dir, filename)) as f:
+                    data = json.load(f)
+            except (ValueError, OSError):
+                continue
+            alive = filename == own or self._pid_alive(pid, tag or None)
+            for name, samples in data.items():
+                metric = self.metrics.get(name)
+                if metric is None or (metric.type_name == 'gauge' and not alive):
+                    continue
+                target = merged[name]
+                for key, value in samples:
+                    key = tuple(key)
+                    if metric.type_name == 'histogram':
+                        current = target.get(key)
+                        target[key] = value if current is None else [a + b for a, b in zip(current, value)]
+                    else:
+                        target[key] = target.get(key, 0) + value
+        return merged
+
+    # ----- exposition -----
+
+    @staticmethod
+    def _format_labels(labelnames, key, extra=None):
+        pairs = list(zip(labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        escaped = [(name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                   for name, value in pairs]
+        return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        collected = self._collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.type_name}")
+            for key, value in sorted(collected.get(name, {}).items()):
+                if metric.type_name == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets, value):
+                        cumulative += count
+                        labels = self._format_labels(metric.labelnames, key, ('le', repr(float(bound))))
+                        lines.append(f"{name}_bucket{labels} {cumulative}")
+                    labels = self._format_labels(metric.labelnames, key, ('le', '+Inf'))
+                    lines.append(f"{name}_bucket{labels} {value[-1]}")
+                    labels = self._format_labels(metric.labelnames, key)
+                    lines.append(f"{name}_sum{labels} {value[-2]}")
+                    lines.append(f"{name}_count{labels} {value[-1]}")
+                else:
+                    lines.append(f"{name}{self._format_labels(metric.labelnames, key)} {value}")
+        return '\n'.join(lines) + '\n'
+
+# Global registry instance
+registry = MetricsRegistry(Config.METRICS_MULTIPROC_DIR or None, Config.METRICS_FLUSH_INTERVAL)
+
+# ----- Flask request metrics -----
+
+http_requests_total = registry.counter(
+    'http_requests_total', 'HTTP requests handled, by route and status code', ('method', 'route', 'status'))
+http_request_duration_seconds = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency in seconds, by route', ('method', 'route'))
+http_requests_in_flight = registry.gauge(
+    'http_requests_in_flight', 'HTTP requests currently being handled, by route', ('route',))
+
+# ----- TradingView upstream metrics -----
+
+tradingview_requests_total = registry.counter(
+    'tradingview_requests_total', 'TradingView upstream calls, by endpoint and status code', ('endpoint', 'status'))
+tradingview_request_duration_seconds = registry.histogram(
+    'tradingview_request_duration_seconds', 'TradingView upstream call latency in seconds, by endpoint',
+    ('endpoint', 'status'))
+tradingview_reauth_total = registry.counter(
+    'tradingview_reauth_total', 'TradingView re-authentications, by result', ('result',))
+tradingview_retries_total = registry.counter(
+    'tradingview_retries_total', 'TradingView upstream calls retried, by endpoint', ('endpoint',))
+tradingview_rate_limit_wait_seconds_total = registry.counter(
+    'tradingview_rate_limit_wait_seconds_total', 'Seconds spent waiting on upstream pacing, by reason', ('reason',))
+singleflight_calls_total = registry.counter(
+    'singleflight_calls_total', 'Coalesced upstream reads, by operation and role (leader ran it, follower shared it)',
+    ('group', 'role'))
+outbox_events_total = registry.counter(
+    'outbox_events_total', 'Access change events, by result (published, delivered, dead_lettered)', ('result',))
+outbox_delivery_failures_total = registry.counter(
+    'outbox_delivery_failures_total', 'Failed outbox batch deliveries, by sink type', ('sink',))
+upstream_queue_wait_seconds_total = registry.counter(
+    'upstream_queue_wait_seconds_total', 'Time upstream calls waited for a fair-queued slot, by actor', ('flow',))
+agent_quota_rejections_total = registry.counter(
+    'agent_quota_rejections_total', 'Agent grant requests refused with 429, by limit (grants, concurrent)', ('limit',))
@@ -1,11 +1,24 @@
 from datetime import datetime
+import json
+import logging
+import os
 import secrets
 import string
+from config import Config
+from activity_stats import activity_stats
+from outbox import event_outbox
+from audit_search import audit_search
+
+logger = logging.getLogger(__name__)
 
 # In-memory storage for the application
 access_logs = []
 pine_scripts = {}
 
+# Bumped on every catalog change; keys cached renders of the script list
+catalog_state = {'version': 0, 'sorted': None, 'sorted_version': -1}
+log_counters = {'successful_grants': 0}
+
 class AccessLog:
     """In-memory access log storage"""
 
@@ -19,10 +32,17 @@ class AccessLog:
         self.details = details
 
     @staticmethod
-    def create(username, pine_id, pine_script_name, operation, status, details=""):
-        """Create and store a new access log"""
+    def create(username, pine_id, pine_script_name, operation, status, details="", actor="system"):
+        """Create and store a new access log; actor is "admin", "agent" or "system" (background jobs)"""
         log = AccessLog(username, pine_id, pine_script_name, operation, status, details)
+        log.actor = actor
         access_logs.append(log)
+        if operation == 'grant' and status == 'success':
+            log_counters['successful_grants'] += 1
+        activity_stats.record(operation, status, pine_id, actor)
+        audit_search.add(log)
+        if Config.OUTBOX_ENABLED:
+            event_outbox.publish_access_log(log)
         return log
 
     @staticmethod
@@ -30,10 +50,15 @@ class AccessLog:
         """Get all access logs"""
         return access_logs
 
+    @staticmethod
+    def get_recent(limit=20):
+        """Get the newest access logs first (logs are appended in time order)"""
+        return access_logs[:-limit - 1:-1] if limit > 0 else []
+
     @staticmethod
     def count_successful_grants():
         """Count successful grant operations"""
-        return sum(1 for log in access_logs if log.operation == 'grant' and log.status == 'success')
+        return log_counters['successful_grants']
 
 class PineScript:
     """In-memory Pine Script storage"""
@@ -51,6 +76,7 @@ class PineScript:
         """Create and store a new Pine Script"""
         script = PineScript(pine_id, name, description, is_active, is_visible_to_agent)
         pine_scripts[pine_id] = script
+        PineScript.bump_version()
         return script
 
     @staticmethod
@@ -78,9 +104,29 @@ class PineScript:
         """Delete Pine Script"""
         if pine_id in pine_scripts:
             del pine_scripts[pine_id]
+            PineScript.bump_version()
             return True
         return False
 
+    @staticmethod
+    def get_sorted():
+        """Get all Pine Scripts newest first, cached until the catalog changes"""
+        version = catalog_state['version']
+        if catalog_state['sorted_version'] != version:
+            catalog_state['sorted'] = sorted(pine_scripts.values(), key=lambda x: x.created_at, reverse=True)
+            catalog_state['sorted_version'] = version
+        return catalog_state['sorted']
+
+    @staticmethod
+    def bump_version():
+        """Mark the catalog as changed"""
+        catalog_state['version'] += 1
+
+    @staticmethod
+    def version():
+        """Current catalog version"""
+        return catalog_state['version']
+
     @staticmethod
     def count():
         """Count total Pine Scripts"""
@@ -92,27 +138,26 @@ class PineScript:
         return list(set(log.username for log in access_logs if log.pine_id == pine_id))
 
 # Initialize default Pine Scripts
+def load_default_scripts():
+    """Read the default catalog from DEFAULT_SCRIPTS_FILE plus any DEFAULT_PINE_IDS"""
+    default_scripts = []
+    try:
+        if Config.DEFAULT_SCRIPTS_FILE and os.path.exists(Config.DEFAULT_SCRIPTS_FILE):
+            with open(Config.DEFAULT_SCRIPTS_FILE, 'r') as f:
+                default_scripts = [(item['name'], item['pine_id']) for item in json.load(f)]
+    except Exception as e:
+        logger.error(f"Error loading default scripts: {e}")
+
+    known = {pine_id for _, pine_id in default_scripts}
+    for pine_id in Config.DEFAULT_PINE_IDS:
+        pine_id = pine_id.strip()
+        if pine_id and pine_id not in known:
+            default_scripts.append((pine_id, pine_id))
+            known.add(pine_id)
+    return default_scripts
+
 def initialize_default_scripts():
-    """Add default Pine Scripts if none exist"""
+    """Add default Pine Scripts if none exist (called once at app init)"""
     if len(pine_scripts) == 0:
-        default_scripts = [
-            ("Ultraalgo", "PUB;0c59036edcae4c8684c8e17c01eaf137"),
-            ("simplealgo", "PUB;a3690bb3cb3549e7af0378a978f96a43"),
-            ("Million moves.", "PUB;53828990c8014de895162ec99f480803"),
-            ("luxalgo", "PUB;b73e59a4d74e4d3d9a449ad1187b786b"),
-            ("lux Osi Matrix", "PUB;996c8fa1a3d74270b95e24643df04fd5"),
-            ("infnity algo", "PUB;bfb44fdc5d234c4f8aa5fd06f1bf56a6"),
-            ("Diamond algo", "PUB;504fed266bcf48d8ad1d2c7bbe1927ff"),
-            ("Blue signals", "PUB;278e02e275914ad5a5cec9ce0e9d9d22"),
-            ("Goatalgo", "PUB;0a056b6e1feb4183abf6e601d4140189"),
-            ("xpalgo", "PUB;5e901ec6f78043b4bca09e8c2f911e01"),
-            ("NovaAlgo", "PUB;f42a2d8c9ede4bc4b005fb8e56b500cc"),
-            ("PrimeAlgo", "PUB;933c9921bf5845bb844b3e09f371b271"),
-            ("Prime OB", "PUB;19ad042efef94ad681fbc27812a15b92"),
-            ("Prime OSI", "PUB;78ea5893ce664b64b15aa737eba353f9"),
-            ("SMRTAlgo", "PUB;cd52ab53c0154f3da9f66de7d1709f29"),
-            ("PRO V6", "PUB;cd88bb06edd74f0d9af1958980d63aad"),
-        ]
-
-        for name, pine_id in default_scripts:
-            PineScript.create(pine_id, name, f"Default {name} script", True)
\ No newline at end of file
+        for name, pine_id in load_default_scripts():
+            PineScript.create(pine_id, name, f"Default {name} script", True)
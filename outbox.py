@@ -0,0 +1,339 @@
+"""Durable outbox of access change events for downstream systems.
+
+Successful grants, removals, extensions and purges are appended as JSON
+lines to a per-process journal under OUTBOX_DIR. Appending is a buffered
+write to the page cache, so it adds no measurable latency to the request. A
+background dispatcher delivers the journal in order, in batches of up to
+OUTBOX_BATCH_SIZE, to each configured sink (webhook, file or Unix socket).
+Each sink has its own persisted cursor. A failed batch is retried with
+exponential backoff and blocks later events of the same journal, so events
+published by one process arrive in order. Journals of different worker
+processes are delivered independently, so events for one username published
+by different workers have no defined relative order; consumers should use
+the event timestamps. After OUTBOX_MAX_RETRIES failures the batch goes to
+dead_letter.jsonl. Journals left by exited processes are picked up and
+drained by a live one.
+
+OUTBOX_SINKS is a comma-separated list such as
+"webhook:https://example.com/hooks/access,file:instance/outbox/events.jsonl,socket:/run/bot.sock".
+"""
+import fcntl
+import glob
+import hashlib
+import hmac
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+import logging
+from datetime import datetime, timezone
+import requests
+from config import Config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = {
+    'grant': 'access.granted',
+    'remove': 'access.removed',
+    'extend': 'access.extended',
+    'purge': 'access.purged'
+}
+
+JOURNAL_OPEN_ATTEMPTS = 3
+
+class WebhookSink:
+    """POST batches as {"events": [...]}, signed with OUTBOX_WEBHOOK_SECRET when set"""
+
+    def __init__(self, url):
+        self.name = f"webhook:{url}"
+        self.url = url
+        self.session = requests.Session()
+
+    def send(self, events):
+        body = json.dumps({"events": events}).encode()
+        headers = {'Content-Type': 'application/json'}
+        if Config.OUTBOX_WEBHOOK_SECRET:
+            signature = hmac.new(Config.OUTBOX_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+            headers['X-Outbox-Signature'] = f"sha256={signature}"
+        response = self.session.post(self.url, data=body, headers=headers, timeout=10)
+        response.raise_for_status()
+
+class FileSink:
+    """Append events as JSON lines to a local file"""
+
+    def __init__(self, path):
+        self.name = f"file:{path}"
+        self.path = path
+
+    def send(self, events):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(''.join(json.dumps(event) + '\n' for event in events))
+
+class SocketSink:
+    """Send events as JSON lines over a local Unix socket"""
+
+    def __init__(self, path):
+        self.name = f"socket:{path}"
+        self.path = path
+
+    def send(self, events):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(5)
+            sock.connect(self.path)
+            sock.sendall(''.join(json.dumps(event) + '\n' for event in events).encode())
+
+SINK_TYPES = {'webhook': WebhookSink, 'file': FileSink, 'socket': SocketSink}
+
+def parse_sinks(value):
+    """Build sinks from an OUTBOX_SINKS value"""
+    sinks = []
+    for item in value.split(','):
+        kind, _, target = item.strip().partition(':')
+        if not item.strip():
+            continue
+        if kind not in SINK_TYPES or not target:
+            logger.error("Ignoring unknown outbox sink: %s", item)
+            continue
+        sinks.append(SINK_TYPES[kind](target))
+    return sinks
+
+def _sink_key(sink):
+    return hashlib.sha1(sink.name.encode()).hexdigest()[:10]
+
+class EventOutbox:
+    """Per-process journal plus a background dispatcher"""
+
+    def __init__(self, directory=None, sinks=None):
+        self.directory = directory or Config.OUTBOX_DIR
+        self.sinks = parse_sinks(Config.OUTBOX_SINKS) if sinks is None else sinks
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._journal = None
+        self._journal_pid = None
+        self._journal_file = None
+        self._thread = None
+        self._backoff = {}  # (journal path, sink name) -> (failures, next attempt time)
+
+    # ----- publishing (request path) -----
+
+    def _journal_path(self, name=None):
+        return os.path.join(self.directory, f"outbox-{name or os.getpid()}.jsonl")
+
+    def _open_journal(self):
+        if self._journal is not None and self._journal_pid == os.getpid():
+            return self._journal
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._journal_path()
+        for attempt in range(JOURNAL_OPEN_ATTEMPTS):
+            journal = open(path, 'a')
+            try:
+                fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)  # Held for life; marks the journal as owned
+                break
+            except OSError:
+                journal.close()
+                if attempt == JOURNAL_OPEN_ATTEMPTS - 1:
+                    raise
+                # Another process is adopting a journal an exited process with our pid left here
+                path = self._journal_path(f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        self._journal, self._journal_pid, self._journal_file = journal, os.getpid(), path
+        return journal
+
+    def publish(self, event_type, payload):
+        """Append an event to this process's journal and wake the dispatcher"""
+        event = {
+            "id": uuid.uuid4().hex,
+            "type": event_type,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            **payload
+        }
+        try:
+            with self._write_lock:
+                journal = self._open_journal()
+                journal.write(json.dumps(event) + '\n')
+                journal.flush()
+            metrics.outbox_events_total.inc(result="published")
+        except Exception as e:
+            logger.error("Error writing outbox event %s: %s", event_type, e)
+            return
+        self.start()
+        self._wake.set()
+
+    def publish_access_log(self, log):
+        """Publish the access change recorded by a successful AccessLog entry"""
+        event_type = EVENT_TYPES.get(log.operation)
+        if event_type is None or log.status != 'success':
+            return
+        self.publish(event_type, {
+            "username": log.username,
+            "pine_id": log.pine_id,
+            "script_name": log.pine_script_name,
+            "actor": getattr(log, 'actor', 'system'),
+            "details": log.details
+        })
+
+    # ----- dispatching (background thread) -----
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+        self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(Config.OUTBOX_FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                self.dispatch()
+            except Exception as e:
+                logger.error("Outbox dispatch error: %s", e)
+
+    def dispatch(self):
+        """Deliver everything pending in this process's journal and in orphaned journals"""
+        own = self._journal_file if self._journal_pid == os.getpid() else None
+        for path in sorted(glob.glob(os.path.join(self.directory, 'outbox-*.jsonl'))):
+            if path == own:
+                self._drain(path)
+                self._compact(path)
+            else:
+                self._adopt(path)
+
+    def _adopt(self, path):
+        """Drain and delete a journal whose owning process has exited"""
+        try:
+            handle = open(path, 'a')
+        except OSError:
+            return
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return  # Still owned by a live process
+        try:
+            if self._drain(path):
+                for leftover in [path] + glob.glob(f"{path}.*.offset"):
+                    os.remove(leftover)
+                logger.info("Drained outbox journal %s", os.path.basename(path))
+        finally:
+            handle.close()
+
+    def _drain(self, path):
+        """Deliver a journal to every sink; True when all sinks are caught up"""
+        caught_up = True
+        for sink in self.sinks:
+            if not self._drain_sink(path, sink):
+                caught_up = False
+        return caught_up
+
+    def _drain_sink(self, path, sink):
+        key = (path, sink.name)
+        failures, next_attempt = self._backoff.get(key, (0, 0.0))
+        if time.time() < next_attempt:
+            return False
+
+        offset_path = f"{path}.{_sink_key(sink)}.offset"
+        offset = _read_offset(offset_path)
+        while not self._stop.is_set():
+            events, next_offset = _read_batch(path, offset, Config.OUTBOX_BATCH_SIZE)
+            if not events:
+                return True
+            try:
+                sink.send(events)
+                metrics.outbox_events_total.inc(len(events), result="delivered")
+                failures = 0
+                self._backoff.pop(key, None)
+            except Exception as e:
+                failures += 1
+                metrics.outbox_delivery_failures_total.inc(sink=sink.name.split(':', 1)[0])
+                if failures < Config.OUTBOX_MAX_RETRIES:
+                    delay = min(300, 2 ** failures)
+                    self._backoff[key] = (failures, time.time() + delay)
+                    logger.warning("Outbox delivery to %s failed (%s), retrying in %ss", sink.name, e, delay)
+                    return False
+                logger.error("Outbox delivery to %s failed %s times, dead-lettering %s events: %s",
+                             sink.name, failures, len(events), e)
+                self._dead_letter(sink, events, str(e))
+                failures = 0
+                self._backoff.pop(key, None)
+            offset = next_offset
+            _write_offset(offset_path, offset)
+        return False
+
+    def _dead_letter(self, sink, events, error):
+        with open(os.path.join(self.directory, 'dead_letter.jsonl'), 'a') as f:
+            for event in events:
+                f.write(json.dumps({"sink": sink.name, "error": error, "event": event}) + '\n')
+        metrics.outbox_events_total.inc(len(events), result="dead_lettered")
+
+    def _compact(self, path):
+        """Truncate this process's journal once every sink has delivered all of it"""
+        with self._write_lock:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                return
+            if size < Config.OUTBOX_COMPACT_BYTES:
+                return
+            offset_paths = [f"{path}.{_sink_key(sink)}.offset" for sink in self.sinks]
+            if any(_read_offset(offset_path) < size for offset_path in offset_paths):
+                return
+            self._journal.truncate(0)
+            for offset_path in offset_paths:
+                _write_offset(offset_path, 0)
+
+    def pending(self):
+        """Undelivered bytes per sink across all journals"""
+        result = {}
+        for path in glob.glob(os.path.join(self.directory, 'outbox-*.jsonl')):
+            size = os.path.getsize(path)
+            for sink in self.sinks:
+                behind = size - _read_offset(f"{path}.{_sink_key(sink)}.offset")
+                result[sink.name] = result.get(sink.name, 0) + max(0, behind)
+        return result
+
+def _read_offset(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+def _write_offset(path, offset):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(str(offset))
+    os.replace(tmp_path, path)
+
+def _read_batch(path, offset, limit):
+    """Read up to limit complete JSON lines from offset; returns (events, offset after them)"""
+    events = []
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            while len(events) < limit:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    break  # Partial write still in progress
+                offset += len(line)
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    logger.error("Skipping malformed outbox line at %s in %s", offset, path)
+    except OSError:
+        pass
+    return events, offset
+
+# Global outbox (publishes only when OUTBOX_ENABLED)
+event_outbox = EventOutbox()
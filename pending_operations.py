@@ -0,0 +1,245 @@
+"""Durable queue of grant and remove intents for when TradingView is unavailable.
+
+When a grant or removal fails because TradingView is down (authentication
+failure, connection error, HTTP 429 or 5xx), the route records the intent
+here and answers right away instead of returning an error. Intents live in a
+SQLite database at PENDING_QUEUE_FILE, so they survive restarts and are
+shared by all worker processes. Only the latest intent per (username,
+pine_id) is kept pending; a newer one supersedes it. A drainer thread applies
+pending intents in order once TradingView recovers, backing off between
+attempts, and records the outcome in AccessLog. For PENDING_UPSTREAM_COOLDOWN
+seconds after a transient failure, routes in every worker queue new intents
+without calling TradingView at all.
+"""
+import threading
+import time
+import logging
+from config import Config
+from sqlite_pool import SQLitePool
+from models import AccessLog, PineScript
+from tradingview import tv_api
+from user_index import user_access_index
+
+logger = logging.getLogger(__name__)
+
+STATES = ("pending", "applying", "applied", "failed", "superseded")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS intents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    action TEXT NOT NULL,
+    username TEXT NOT NULL,
+    user_key TEXT NOT NULL,
+    pine_id TEXT NOT NULL,
+    duration TEXT,
+    actor TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS intents_state ON intents (state, next_attempt_at);
+CREATE INDEX IF NOT EXISTS intents_target ON intents (user_key, pine_id, state);
+CREATE TABLE IF NOT EXISTS upstream_state (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+COLUMNS = ("id", "action", "username", "pine_id", "duration", "actor", "state",
+           "attempts", "last_error", "created_at", "updated_at", "next_attempt_at")
+
+CLAIM_LEASE = 300  # Seconds before an intent left "applying" by a dead process is retried
+DRAIN_BATCH = 50
+
+class PendingOperations:
+    """SQLite-backed intent queue plus its background drainer"""
+
+    def __init__(self, path=None):
+        self.path = path or Config.PENDING_QUEUE_FILE
+        self._pool = SQLitePool(self.path, SCHEMA, pragmas=("PRAGMA journal_mode=WAL",))
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _db(self):
+        return self._pool.connection()
+
+    def _execute(self, sql, params=()):
+        """Run one statement on a pooled connection; returns its rows"""
+        with self._db() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    # ----- request path -----
+
+    def enqueue(self, action, username, pine_id, duration=None, actor="system", error=None):
+        """Record an intent, superseding any pending one for the same user and script; returns its id"""
+        now = time.time()
+        with self._db() as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE intents SET state = 'superseded', updated_at = ? "
+                "WHERE user_key = ? AND pine_id = ? AND state = 'pending'",
+                (now, username.lower(), pine_id))
+            cursor = conn.execute(
+                "INSERT INTO intents (action, username, user_key, pine_id, duration, actor, state, "
+                "last_error, created_at, updated_at, next_attempt_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, 'pending', ?, ?, ?, ?)",
+                (action, username, username.lower(), pine_id, duration, actor, error, now, now, now))
+        logger.info("Queued %s of %s for %s (intent %s)", action, pine_id, username, cursor.lastrowid)
+        self._wake.set()
+        return cursor.lastrowid
+
+    def should_queue(self, username, pine_id):
+        """Queue instead of calling TradingView while it is down or an earlier intent is still waiting"""
+        if not self.upstream_available():
+            return True
+        return bool(self._execute(
+            "SELECT 1 FROM intents WHERE user_key = ? AND pine_id = ? AND state IN ('pending', 'applying') LIMIT 1",
+            (username.lower(), pine_id)))
+
+    def mark_upstream_down(self):
+        """Start the cooldown; kept in the database so every worker process honours it"""
+        self._execute(
+            "INSERT INTO upstream_state (key, value) VALUES ('down_until', ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)",
+            (time.time() + Config.PENDING_UPSTREAM_COOLDOWN,))
+
+    def upstream_available(self):
+        rows = self._execute("SELECT value FROM upstream_state WHERE key = 'down_until'")
+        return not rows or time.time() >= rows[0][0]
+
+    def get(self, intent_id):
+        rows = self._execute(f"SELECT {', '.join(COLUMNS)} FROM intents WHERE id = ?", (intent_id,))
+        return dict(zip(COLUMNS, rows[0])) if rows else None
+
+    def list(self, state=None, limit=100):
+        """Newest intents first, optionally in one state"""
+        query = f"SELECT {', '.join(COLUMNS)} FROM intents"
+        params = ()
+        if state:
+            query += " WHERE state = ?"
+            params = (state,)
+        rows = self._execute(query + " ORDER BY id DESC LIMIT ?", params + (limit,))
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def stats(self):
+        counts = dict(self._execute("SELECT state, COUNT(*) FROM intents GROUP BY state"))
+        oldest = self._execute("SELECT MIN(created_at) FROM intents WHERE state = 'pending'")[0][0]
+        return {
+            "depth": counts.get("pending", 0) + counts.get("applying", 0),
+            "states": {state: counts.get(state, 0) for state in STATES},
+            "oldest_pending_seconds": round(time.time() - oldest, 1) if oldest else None,
+            "upstream_available": self.upstream_available()
+        }
+
+    # ----- drainer -----
+
+    def _claim(self, now):
+        """Move due intents to "applying", skipping targets that already have one in flight"""
+        with self._db() as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE intents SET state = 'pending' WHERE state = 'applying' AND updated_at < ?",
+                         (now - CLAIM_LEASE,))
+            rows = conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM intents AS i WHERE state = 'pending' AND next_attempt_at <= ? "
+                "AND NOT EXISTS (SELECT 1 FROM intents WHERE user_key = i.user_key AND pine_id = i.pine_id "
+                "AND state = 'applying') ORDER BY id LIMIT ?",
+                (now, DRAIN_BATCH)).fetchall()
+            conn.executemany("UPDATE intents SET state = 'applying', updated_at = ? WHERE id = ?",
+                             [(now, row[0]) for row in rows])
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def _finish(self, intent, state, error=None, next_attempt_at=None, attempted=True):
+        now = time.time()
+        attempts = intent['attempts'] + (1 if attempted else 0)
+        self._execute(
+            "UPDATE intents SET state = ?, attempts = ?, last_error = ?, updated_at = ?, next_attempt_at = ? "
+            "WHERE id = ?",
+            (state, attempts, error, now, next_attempt_at or now, intent['id']))
+
+    def drain_once(self):
+        """Apply every due intent; stops early when TradingView is still unavailable. Returns intents applied"""
+        if not self.upstream_available():
+            return 0
+        applied = 0
+        while not self._stop.is_set():
+            intents = self._claim(time.time())
+            if not intents:
+                return applied
+            for index, intent in enumerate(intents):
+                result = self._apply(intent)
+                if result['success']:
+                    applied += 1
+                    self._finish(intent, 'applied')
+                    self._log(intent, "success", f"Applied from queue: {result['message']}")
+                elif result.get('retryable') and intent['attempts'] + 1 < Config.PENDING_MAX_ATTEMPTS:
+                    delay = min(Config.PENDING_BACKOFF_MAX, 5 * 2 ** intent['attempts'])
+                    self._finish(intent, 'pending', result['message'], time.time() + delay)
+                    self.mark_upstream_down()
+                    for untried in intents[index + 1:]:
+                        self._finish(untried, 'pending', untried['last_error'], attempted=False)
+                    logger.warning("TradingView still unavailable (%s); retrying queued operations later",
+                                   result['message'])
+                    return applied
+                else:
+                    self._finish(intent, 'failed', result['message'])
+                    self._log(intent, "failure", f"Queued {intent['action']} failed: {result['message']}")
+        return applied
+
+    def _apply(self, intent):
+        try:
+            if intent['action'] == 'grant':
+                result = tv_api.grant_many(intent['username'], [intent['pine_id']], intent['duration'] or "1L")[0]
+                if result['success']:
+                    user_access_index.record_access(intent['username'], intent['pine_id'], True, result['expiration'])
+                return result
+            result = tv_api.remove_pine_permission(intent['username'], intent['pine_id'])
+            if result.get('success'):
+                user_access_index.record_access(intent['username'], intent['pine_id'], False)
+            return result
+        except Exception as e:
+            logger.error("Error applying queued intent %s: %s", intent['id'], e)
+            return {"success": False, "message": str(e), "retryable": True}
+
+    @staticmethod
+    def _log(intent, status, details):
+        script = PineScript.get(intent['pine_id'])
+        if intent['action'] == 'grant':
+            details = f"Duration: {intent['duration'] or '1L'}, {details}"
+        AccessLog.create(
+            username=intent['username'],
+            pine_id=intent['pine_id'],
+            pine_script_name=script.name if script else intent['pine_id'],
+            operation=intent['action'],
+            status=status,
+            details=details,
+            actor=intent['actor']
+        )
+
+    def start(self):
+        """Drain every PENDING_DRAIN_INTERVAL seconds (sooner when an intent is queued) on a daemon thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.drain_once()
+                except Exception as e:
+                    logger.error("Pending operations drain error: %s", e)
+                self._wake.wait(Config.PENDING_DRAIN_INTERVAL)
+                self._wake.clear()
+
+        self._thread = threading.Thread(target=loop, name="pending-operations", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+# Global pending operations queue
+pending_operations = PendingOperations()
@@ -0,0 +1,195 @@
+"""On-demand request profiling for admins.
+
+An admin request carrying the X-Profile header or a profile query flag
+("sample" or "cprofile") is wrapped in a profiler. Sampling profiles are
+saved in the speedscope format, deterministic ones as pstats files, both
+under PROFILE_DIR with only the newest PROFILE_RETENTION files kept.
+Only one cProfile profile can be active per process (Python 3.12 refuses a
+second, and green threads would share its hook), so a cprofile request that
+arrives while another runs falls back to the sampler, or under green
+threads goes unprofiled.
+Requests without the flag never touch this module beyond one lookup.
+"""
+import cProfile
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+from config import Config
+from concurrency import cooperative_mode
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('sample', 'cprofile')
+_PROFILE_NAME = re.compile(r'^[\w.-]+\.(speedscope\.json|prof)$')
+_cprofile_lock = threading.Lock()  # Held while a DeterministicProfiler is enabled
+
+class SamplingProfiler:
+    """Samples the stack of one thread at a fixed interval"""
+
+    extension = 'speedscope.json'
+
+    def __init__(self, interval=None):
+        self.interval = interval or Config.PROFILE_SAMPLE_INTERVAL
+        self.thread_id = threading.get_ident()
+        self.frames = []
+        self.frame_index = {}
+        self.samples = []
+        self.weights = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _frame_id(self, code):
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self.frame_index.get(key)
+        if index is None:
+            index = self.frame_index[key] = len(self.frames)
+            self.frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return index
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_id(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append(now - last)
+            last = now
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._stop.is_set():
+            self._stop.set()
+            self._thread.join()
+            self.duration = time.perf_counter() - self.started
+
+    def save(self, path, name):
+        data = {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "tradingview-access-manager",
+            "shared": {"frames": self.frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(self.weights),
+                "samples": self.samples,
+                "weights": self.weights
+            }]
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+class DeterministicProfiler:
+    """Wraps cProfile for exact call counts and timings"""
+
+    extension = 'prof'
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.duration = None
+
+    def start(self):
+        """Enable the profile; the caller must hold _cprofile_lock"""
+        self.started = time.perf_counter()
+        try:
+            self.profile.enable()
+        except Exception:
+            _cprofile_lock.release()
+            raise
+
+    def stop(self):
+        if self.duration is not None:
+            return
+        self.profile.disable()
+        self.duration = time.perf_counter() - self.started
+        _cprofile_lock.release()
+
+    def save(self, path, name):
+        self.profile.dump_stats(path)
+
+def requested_mode(req):
+    """Return the profiling mode asked for by a request, or None"""
+    value = req.headers.get('X-Profile') or req.args.get('profile')
+    if not value:
+        return None
+    value = value.lower()
+    if value in PROFILE_MODES:
+        return value
+    return 'sample' if value in ('1', 'true', 'yes') else None
+
+def start_profiler(mode):
+    """Start a profiler for the current request; None when it cannot be profiled right now"""
+    # Green threads share one OS thread, so the stack sampler cannot single out a request
+    cooperative = cooperative_mode()
+    if cooperative:
+        mode = 'cprofile'
+    if mode == 'cprofile':
+        if _cprofile_lock.acquire(blocking=False):
+            profiler = DeterministicProfiler()
+            profiler.start()
+            return profiler
+        if cooperative:
+            logger.info("Another request is being profiled; skipping this one")
+            return None
+        logger.info("Another cProfile profile is active; sampling this request instead")
+    profiler = SamplingProfiler()
+    profiler.start()
+    return profiler
+
+def save_profile(profiler, label):
+    """Stop the profiler, write its profile and apply retention; returns the file name"""
+    profiler.stop()
+    os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r'[^\w-]+', '_', label).strip('_')[:60] or 'request'
+    filename = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{slug}_{int(profiler.duration * 1000)}ms.{profiler.extension}"
+    profiler.save(os.path.join(Config.PROFILE_DIR, filename), label)
+    _apply_retention()
+    logger.info(f"Saved request profile {filename}")
+    return filename
+
+def _apply_retention():
+    profiles = list_profiles()
+    for profile in profiles[Config.PROFILE_RETENTION:]:
+        try:
+            os.remove(os.path.join(Config.PROFILE_DIR, profile['name']))
+        except OSError as e:
+            logger.error(f"Error removing old profile {profile['name']}: {e}")
+
+def list_profiles():
+    """List saved profiles, newest first"""
+    if not os.path.isdir(Config.PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(Config.PROFILE_DIR):
+        if not _PROFILE_NAME.match(name):
+            continue
+        stat = os.stat(os.path.join(Config.PROFILE_DIR, name))
+        profiles.append({
+            "name": name,
+            "format": "speedscope" if name.endswith('.speedscope.json') else "pstats",
+            "size": stat.st_size,
+            "created_at": datetime.fromtimestamp(stat.st_mtime).isoformat()
+        })
+    profiles.sort(key=lambda profile: profile['name'], reverse=True)
+    return profiles
+
+def is_profile_name(name):
+    return bool(_PROFILE_NAME.match(name))
@@ -0,0 +1,271 @@
+"""Scheduled purge of expired and policy-violating temporary grants.
+
+A sweep lists the users of every catalog script (PURGE_PARALLEL_SCRIPTS
+scripts at a time) and removes grants that expired more than
+PURGE_GRACE_HOURS ago or belong to a user in PURGE_BLOCKED_USERS, in batches
+of PURGE_BATCH_SIZE with PURGE_BATCH_PAUSE seconds between batches (each
+removal also draws on the owning account's rate budget). Removals are
+recorded in AccessLog. Progress is checkpointed to PURGE_CHECKPOINT_FILE
+after every script, so a sweep interrupted by a restart resumes with the
+scripts it had not finished. A file lock makes sure only one process (e.g.
+one gunicorn worker) sweeps at a time.
+"""
+import fcntl
+import json
+import os
+import secrets
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from config import Config
+from models import AccessLog, PineScript
+from tradingview import tv_api
+from user_index import user_access_index
+from renewals import parse_expiration
+import tracing
+
+logger = logging.getLogger(__name__)
+
+MAX_SAMPLE_CANDIDATES = 100  # Dry run findings kept for the summary
+
+def find_purge_candidates(users, now=None):
+    """Return [(user, reason)] for grants that expired past the grace window or violate policy"""
+    now = now or datetime.now()
+    cutoff = now - timedelta(hours=Config.PURGE_GRACE_HOURS)
+    blocked = {name.strip().lower() for name in Config.PURGE_BLOCKED_USERS.split(',') if name.strip()}
+
+    candidates = []
+    for user in users:
+        username = user.get('username', '')
+        if not username:
+            continue
+        if username.lower() in blocked:
+            candidates.append((user, "blocked user"))
+            continue
+        if user.get('has_lifetime_access') or user.get('expiration') is None:
+            continue
+        expiration = parse_expiration(user.get('expiration'))
+        if expiration is not None and expiration < cutoff:
+            candidates.append((user, f"expired {user['expiration']}"))
+    return candidates
+
+class PurgeSweep:
+    """One pass over the catalog, resumable from its checkpoint"""
+
+    def __init__(self, dry_run, checkpoint=None):
+        checkpoint = checkpoint or {}
+        self.id = checkpoint.get('sweep_id') or secrets.token_urlsafe(8)
+        self.dry_run = dry_run  # Only resumed from a checkpoint taken in the same mode
+        self.started_at = checkpoint.get('started_at') or datetime.now().isoformat()
+        self.completed = checkpoint.get('completed', {})  # pine_id -> per-script summary
+        self.status = "running"
+        self.finished_at = None
+        self.candidates = []  # Dry run findings, capped at MAX_SAMPLE_CANDIDATES
+        self._lock = threading.Lock()
+
+    def to_checkpoint(self):
+        with self._lock:
+            return {
+                "sweep_id": self.id,
+                "dry_run": self.dry_run,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "status": self.status,
+                "completed": dict(self.completed)
+            }
+
+    def summary(self):
+        data = self.to_checkpoint()
+        totals = {"scripts": len(data['completed']), "candidates": 0, "removed": 0, "failed": 0}
+        for result in data['completed'].values():
+            for key in ("candidates", "removed", "failed"):
+                totals[key] += result.get(key, 0)
+        data.pop('completed')
+        data.update(totals)
+        if self.dry_run:
+            data['sample_candidates'] = list(self.candidates)
+        return data
+
+    def run(self, stop_event):
+        pending = [script for script in PineScript.get_all() if script.pine_id not in self.completed]
+        if self.completed:
+            logger.info("Resuming purge sweep %s: %s scripts done, %s left", self.id, len(self.completed), len(pending))
+
+        workers = max(1, min(Config.PURGE_PARALLEL_SCRIPTS, len(pending) or 1))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            purge = tracing.wrap(lambda script: self._purge_script(script, stop_event))
+            for script, result in zip(pending, executor.map(purge, pending)):
+                if result is None:
+                    continue  # Stopped before this script finished; it is redone on resume
+                with self._lock:
+                    self.completed[script.pine_id] = result
+                _save_checkpoint(self.to_checkpoint())
+
+        with self._lock:
+            self.status = "stopped" if stop_event.is_set() else "finished"
+            if self.status == "finished":
+                self.finished_at = datetime.now().isoformat()
+        _save_checkpoint(self.to_checkpoint())
+
+    def _purge_script(self, script, stop_event):
+        if stop_event.is_set():
+            return None
+
+        users = tv_api.get_script_users(script.pine_id)
+        candidates = find_purge_candidates(users)
+        result = {"candidates": len(candidates), "removed": 0, "failed": 0}
+
+        if self.dry_run:
+            with self._lock:
+                room = MAX_SAMPLE_CANDIDATES - len(self.candidates)
+                self.candidates.extend({"script_id": script.pine_id, "username": user['username'], "reason": reason}
+                                       for user, reason in candidates[:max(0, room)])
+            return result
+
+        for start in range(0, len(candidates), Config.PURGE_BATCH_SIZE):
+            if start and stop_event.wait(Config.PURGE_BATCH_PAUSE):
+                return None
+            for user, reason in candidates[start:start + Config.PURGE_BATCH_SIZE]:
+                outcome = tv_api.remove_pine_permission(user['username'], script.pine_id)
+                success = outcome.get('success', False)
+                if success:
+                    result['removed'] += 1
+                    user_access_index.record_access(user['username'], script.pine_id, False)
+                else:
+                    result['failed'] += 1
+                AccessLog.create(
+                    username=user['username'],
+                    pine_id=script.pine_id,
+                    pine_script_name=script.name,
+                    operation="purge",
+                    status="success" if success else "failure",
+                    details=f"Purge sweep {self.id}: {reason}, {outcome.get('message', '')}"
+                )
+
+        if candidates:
+            logger.info("Purged %s/%s grants from %s", result['removed'], len(candidates), script.pine_id)
+        return result
+
+def _load_checkpoint():
+    try:
+        with open(Config.PURGE_CHECKPOINT_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_checkpoint(data):
+    path = Config.PURGE_CHECKPOINT_FILE
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _finished_recently(checkpoint):
+    """Whether the checkpointed sweep completed less than PURGE_INTERVAL seconds ago"""
+    if not checkpoint or checkpoint.get('status') != "finished" or not checkpoint.get('finished_at'):
+        return False
+    try:
+        finished_at = datetime.fromisoformat(checkpoint['finished_at'])
+    except (TypeError, ValueError):
+        return False
+    return (datetime.now() - finished_at).total_seconds() < Config.PURGE_INTERVAL
+
+class PurgeScheduler:
+    """Runs purge sweeps on a schedule or on demand, one at a time across processes"""
+
+    def __init__(self):
+        self.current = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _acquire_file_lock(self):
+        path = f"{Config.PURGE_CHECKPOINT_FILE}.lock"
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        handle = open(path, 'w')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return None
+        return handle
+
+    def run_sweep(self, dry_run=None, scheduled=False):
+        """Run (or resume) a sweep on the calling thread; returns its summary, or None if one is already running"""
+        dry_run = Config.PURGE_DRY_RUN if dry_run is None else dry_run
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            handle = self._acquire_file_lock()
+            if handle is None:
+                logger.info("Purge sweep already running in another process")
+                return None
+            try:
+                checkpoint = _load_checkpoint()
+                # Every worker runs a scheduler; the first one due sweeps and the others skip until the next interval
+                if scheduled and _finished_recently(checkpoint):
+                    logger.info("Skipping scheduled purge sweep; sweep %s finished at %s",
+                                checkpoint.get('sweep_id'), checkpoint.get('finished_at'))
+                    return None
+                if (checkpoint and checkpoint.get('status') in ("running", "stopped")
+                        and checkpoint.get('dry_run', True) == dry_run):
+                    sweep = PurgeSweep(dry_run, checkpoint)
+                else:
+                    if checkpoint and checkpoint.get('status') in ("running", "stopped"):
+                        # Never resume in another mode: a dry run must not finish an interrupted real sweep
+                        logger.info("Not resuming purge sweep %s (dry_run=%s) as a %s sweep; starting a new one",
+                                    checkpoint.get('sweep_id'), checkpoint.get('dry_run'),
+                                    "dry run" if dry_run else "real")
+                    sweep = PurgeSweep(dry_run)
+                self.current = sweep
+                sweep.run(self._stop)
+                logger.info("Purge sweep %s %s: %s", sweep.id, sweep.status, sweep.summary())
+                return sweep.summary()
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+                handle.close()
+        except Exception as e:
+            logger.error("Purge sweep error: %s", e)
+            return None
+        finally:
+            self._lock.release()
+
+    def start_sweep(self, dry_run=None):
+        """Start a sweep on a background thread; False if one is already running here"""
+        if self._lock.locked():
+            return False
+        thread = threading.Thread(target=self.run_sweep, args=(dry_run,), name="purge-sweep", daemon=True)
+        thread.start()
+        return True
+
+    def start(self):
+        """Sweep every PURGE_INTERVAL seconds on a daemon thread"""
+        if self._thread is not None:
+            return self._thread
+
+        def loop():
+            checkpoint = _load_checkpoint()
+            if checkpoint and checkpoint.get('status') in ("running", "stopped"):
+                self.run_sweep()  # Resume the sweep a restart interrupted
+            while not self._stop.wait(Config.PURGE_INTERVAL):
+                self.run_sweep(scheduled=True)
+
+        self._thread = threading.Thread(target=loop, name="purge-scheduler", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        if self.current is not None:
+            return self.current.summary()
+        checkpoint = _load_checkpoint()
+        if checkpoint is None:
+            return None
+        return PurgeSweep(checkpoint.get('dry_run', True), checkpoint).summary() | {"status": checkpoint.get('status')}
+
+# Global purge scheduler
+purge_scheduler = PurgeScheduler()
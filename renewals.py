@@ -0,0 +1,163 @@
+"""Bulk expiration extension for a script's temporary users.
+
+plan_extension() reads the current expirations (from a live user snapshot or
+TradingView) and computes each user's new expiration: the duration is added
+to the current expiration, or to now when it has already passed. Lifetime
+users are left alone. A dry run returns the plan; otherwise an ExtensionJob
+pushes the updates concurrently on a background thread (within the owning
+account's rate budget) and reports progress until it finishes.
+"""
+import re
+import secrets
+import threading
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from models import AccessLog, PineScript
+from tradingview import tv_api
+from user_index import user_access_index
+from user_snapshots import user_snapshots, filter_users
+
+logger = logging.getLogger(__name__)
+
+MAX_JOBS = 20  # Finished jobs kept for progress polling
+TIMED_DURATION = re.compile(r'^\d+[DMY]$')  # e.g. 30D, 6M, 1Y; anything else would fall back to 30 days
+
+def parse_expiration(value):
+    """Parse a TradingView expiration into a naive local datetime (None if absent or malformed)"""
+    try:
+        expiration = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if expiration.tzinfo is not None:
+        expiration = expiration.astimezone().replace(tzinfo=None)
+    return expiration
+
+def plan_extension(pine_id, duration, query='', usernames=None, snapshot_id=''):
+    """Compute [{"username", "current_expiration", "new_expiration"}] for the matching temporary users"""
+    users = user_snapshots.get(snapshot_id, pine_id)
+    if users is None:
+        users = tv_api.get_script_users(pine_id)
+
+    users = filter_users(users, query, 'temporary')
+    if usernames:
+        wanted = {username.lower() for username in usernames}
+        users = [user for user in users if user.get('username', '').lower() in wanted]
+
+    now = datetime.now()
+    plan = []
+    for user in users:
+        current = parse_expiration(user.get('expiration'))
+        start = current if current is not None and current > now else now
+        new_expiration = tv_api._calculate_expiration(duration, start)
+        if new_expiration:
+            plan.append({
+                "username": user['username'],
+                "current_expiration": user.get('expiration'),
+                "new_expiration": new_expiration
+            })
+    return plan
+
+class ExtensionJob:
+    """Pushes a planned extension to TradingView on a background thread"""
+
+    def __init__(self, pine_id, duration, plan):
+        self.id = secrets.token_urlsafe(8)
+        self.pine_id = pine_id
+        self.duration = duration
+        self.plan = plan
+        self.status = "pending"
+        self.done = 0
+        self.succeeded = 0
+        self.errors = []
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name=f"extend-{self.id}", daemon=True)
+        thread.start()
+        return thread
+
+    def run(self):
+        self.status = "running"
+        self.started_at = time.time()
+        script = PineScript.get(self.pine_id)
+        script_name = script.name if script else self.pine_id
+        updated = {}
+
+        def on_result(result):
+            with self._lock:
+                self.done += 1
+                if result['success']:
+                    self.succeeded += 1
+                    updated[result['username']] = result['expiration']
+                else:
+                    self.errors.append(f"{result['username']}: {result['message']}")
+            AccessLog.create(
+                username=result['username'],
+                pine_id=self.pine_id,
+                pine_script_name=script_name,
+                operation="extend",
+                status="success" if result['success'] else "failure",
+                details=f"Extended by {self.duration} to {result['expiration']}, {result['message']}",
+                actor="admin"
+            )
+
+        try:
+            updates = [(item['username'], item['new_expiration']) for item in self.plan]
+            tv_api.set_expirations(self.pine_id, updates, on_result)
+            self.status = "finished"
+        except Exception as e:
+            logger.error("Extension job %s failed: %s", self.id, e)
+            self.errors.append(str(e))
+            self.status = "failed"
+        finally:
+            # Lookups, the users modal and exports read these; bring them in line with TradingView
+            with self._lock:
+                updated = dict(updated)
+            user_access_index.update_expirations(self.pine_id, updated)
+            user_snapshots.update_expirations(self.pine_id, updated)
+            self.finished_at = time.time()
+            logger.info("Extension job %s for %s: %s/%s updated", self.id, self.pine_id, self.succeeded, len(self.plan))
+
+    def progress(self):
+        with self._lock:
+            elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+            return {
+                "job_id": self.id,
+                "script_id": self.pine_id,
+                "duration": self.duration,
+                "status": self.status,
+                "total": len(self.plan),
+                "done": self.done,
+                "succeeded": self.succeeded,
+                "failed": self.done - self.succeeded,
+                "elapsed_seconds": round(elapsed, 2),
+                "errors": self.errors[:50]
+            }
+
+class ExtensionJobs:
+    """Recent extension jobs by id, oldest evicted first"""
+
+    def __init__(self, max_jobs=MAX_JOBS):
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, pine_id, duration, plan):
+        job = ExtensionJob(pine_id, duration, plan)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        job.start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+# Global registry of extension jobs
+extension_jobs = ExtensionJobs()
@@ -1,21 +1,120 @@
-from flask import render_template, request, jsonify, session, redirect, url_for
+from flask import render_template, request, jsonify, session, redirect, url_for, g, Response, send_from_directory
 from app import app
-from models import AccessLog, PineScript, initialize_default_scripts
-from tradingview import TradingViewAPI
+from config import Config
+from models import AccessLog, PineScript
+from tradingview import tv_api
+from user_index import user_access_index
+from user_snapshots import user_snapshots, filter_users
+from renewals import plan_extension, extension_jobs, TIMED_DURATION
+from purge import purge_scheduler
+from pending_operations import pending_operations, STATES as INTENT_STATES
+from activity_stats import activity_stats, RESOLUTIONS
+from audit_search import audit_search
+from agent_quotas import agent_quotas
+import fair_queue
+from fragment_cache import fragment_cache
+import metrics
+import tracing
+import profiling
+import assets
+import time
+import math
+import secrets
 from datetime import datetime
 import logging
 import os
 
 logger = logging.getLogger(__name__)
 
-# Initialize TradingView API
-tv_api = TradingViewAPI()
-
 # Secure credentials from environment variables
 ADMIN_KEY = os.getenv('ADMIN_KEY', '1322preet')
 AGENT_USERNAME = os.getenv('AGENT_USERNAME', 'clipyway@tele.com')
 AGENT_PASSWORD = os.getenv('AGENT_PASSWORD', '1322CLIPYWAY')
 
+# ===== REQUEST METRICS AND TRACING =====
+
+def _metrics_route():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def start_request_metrics():
+    metrics.registry.start_flusher()
+    g.metrics_start = time.perf_counter()
+    g.metrics_route = _metrics_route()
+    metrics.http_requests_in_flight.inc(route=g.metrics_route)
+    if Config.TRACE_ENABLED:
+        g.trace, g.trace_token = tracing.start_trace(f"{request.method} {g.metrics_route}")
+
+@app.after_request
+def record_request_metrics(response):
+    if 'metrics_start' in g:
+        elapsed = time.perf_counter() - g.metrics_start
+        metrics.http_requests_total.inc(method=request.method, route=g.metrics_route,
+                                        status=str(response.status_code))
+        metrics.http_request_duration_seconds.observe(elapsed, method=request.method, route=g.metrics_route)
+    if 'trace' in g:
+        g.trace.finish()
+        g.trace.root.attributes['http.status_code'] = response.status_code
+        response.headers['Server-Timing'] = tracing.server_timing(g.trace)
+        tracing.export_if_slow(g.trace)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    if 'metrics_route' in g:
+        metrics.http_requests_in_flight.dec(route=g.metrics_route)
+    if 'trace_token' in g:
+        tracing.end_trace(g.trace_token)
+
+@app.before_request
+def start_upstream_flow():
+    # Upstream calls made for this request queue fairly against other sessions'
+    g.flow_token = fair_queue.enter_flow(_actor(), session.get('client_id'))
+
+@app.teardown_request
+def finish_upstream_flow(error=None):
+    if 'flow_token' in g:
+        fair_queue.exit_flow(g.flow_token)
+
+@app.before_request
+def start_request_profile():
+    if not (request.headers.get('X-Profile') or request.args.get('profile')):
+        return
+    mode = profiling.requested_mode(request)
+    if mode and session.get('admin_authenticated'):
+        profiler = profiling.start_profiler(mode)
+        if profiler is not None:
+            g.profiler = profiler
+
+@app.after_request
+def save_request_profile(response):
+    if 'profiler' in g:
+        profiler = g.pop('profiler')
+        try:
+            response.headers['X-Profile-Name'] = profiling.save_profile(profiler, f"{request.method} {request.path}")
+        except Exception as e:
+            logger.error(f"Error saving request profile: {e}")
+            profiler.stop()
+    return response
+
+@app.teardown_request
+def discard_request_profile(error=None):
+    # after_request is skipped for unhandled errors; the profiler must still stop (and free cProfile)
+    if 'profiler' in g:
+        g.pop('profiler').stop()
+
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """Serve fingerprinted static assets with long-lived caching"""
+    return assets.serve_asset(app.static_folder, filename)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Expose request and upstream metrics in the Prometheus text format"""
+    if Config.METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {Config.METRICS_TOKEN}":
+        return Response("Unauthorized\n", status=401, mimetype='text/plain')
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
 # ===== MAIN ROUTES =====
 
 @app.route('/')
@@ -23,26 +122,95 @@ def index():
     """Main dashboard - manage Pine Scripts and grant access"""
     if not session.get('admin_authenticated'):
         return redirect(url_for('admin_login'))
-    
-    # Initialize default scripts if needed
-    initialize_default_scripts()
 
-    scripts = PineScript.get_all()
-    access_logs = AccessLog.get_all()
+    page, per_page = _page_args()
+    fragments = _script_fragments(page, per_page)
 
-    # Calculate stats
-    total_scripts = PineScript.count()
-    total_access = AccessLog.count_successful_grants()
+    return render_template('admin.html',
+                         script_selection_html=fragments['script_selection_html'],
+                         script_management_html=fragments['script_management_html'],
+                         pagination=fragments['pagination'],
+                         catalog_version=fragments['catalog_version'],
+                         access_logs=AccessLog.get_recent(20),  # Show last 20 logs
+                         total_scripts=PineScript.count(),
+                         total_access=AccessLog.count_successful_grants())
+
+def _page_args():
+    """Read page/per_page query arguments for the scripts table"""
+    page = max(1, request.args.get('page', 1, type=int) or 1)
+    per_page = request.args.get('per_page', Config.DASHBOARD_PAGE_SIZE, type=int) or Config.DASHBOARD_PAGE_SIZE
+    return page, max(1, min(per_page, 500))
+
+def _script_fragments(page, per_page):
+    """Render (or reuse) the full grant-form selection list and one page of the management list"""
+    version = PineScript.version()
+    scripts = PineScript.get_sorted()
+    total = len(scripts)
+    pages = max(1, (total + per_page - 1) // per_page)
+    page = min(page, pages)
+    pagination = {
+        'page': page,
+        'per_page': per_page,
+        'pages': pages,
+        'total': total,
+        'has_prev': page > 1,
+        'has_next': page < pages
+    }
+
+    def render_page():
+        page_scripts = scripts[(page - 1) * per_page:page * per_page]
+        return (render_template('partials/script_management.html', scripts=page_scripts),
+                render_template('partials/pagination.html', pagination=pagination))
+
+    # Grants may combine scripts from anywhere in the catalog, so only the management list is paginated
+    selection_html = fragment_cache.get_or_render(
+        ('script_selection', version), lambda: render_template('partials/script_selection.html', scripts=scripts))
+    management_html, pagination_html = fragment_cache.get_or_render(
+        ('scripts', version, page, per_page), render_page)
+
+    return {
+        'script_selection_html': selection_html,
+        'script_management_html': management_html,
+        'pagination_html': pagination_html,
+        'pagination': pagination,
+        'catalog_version': version
+    }
+
+@app.route('/api/dashboard')
+def dashboard_data():
+    """Partial dashboard refresh: stats, recent activity and changed script fragments"""
+    if not session.get('admin_authenticated'):
+        return jsonify({"success": False, "error": "Admin authentication required"})
 
-    # Sort by creation date (newest first)
-    scripts.sort(key=lambda x: x.created_at, reverse=True)
-    access_logs.sort(key=lambda x: x.timestamp, reverse=True)
+    try:
+        page, per_page = _page_args()
+        since_version = request.args.get('since_version', -1, type=int)
+        since_page = request.args.get('since_page', -1, type=int)
 
-    return render_template('admin.html',
-                         scripts=scripts,
-                         access_logs=access_logs[:20],  # Show last 20 logs
-                         total_scripts=total_scripts,
-                         total_access=total_access)
+        data = {
+            "success": True,
+            "stats": {
+                "total_scripts": PineScript.count(),
+                "total_access": AccessLog.count_successful_grants()
+            },
+            "access_logs_html": render_template('partials/access_logs.html', access_logs=AccessLog.get_recent(20))
+        }
+
+        fragments = _script_fragments(page, per_page)
+        data["catalog_version"] = fragments['catalog_version']
+        data["pagination"] = fragments['pagination']
+        # Only ship the script lists when the client's copy is out of date
+        catalog_changed = since_version != fragments['catalog_version']
+        if catalog_changed:
+            data["script_selection_html"] = fragments['script_selection_html']
+        if catalog_changed or since_page != fragments['pagination']['page']:
+            data["script_management_html"] = fragments['script_management_html']
+            data["pagination_html"] = fragments['pagination_html']
+
+        return jsonify(data)
+    except Exception as e:
+        logger.error(f"Error building dashboard data: {e}")
+        return jsonify({"success": False, "error": str(e)})
 
 @app.route('/admin_login', methods=['GET', 'POST'])
 def admin_login():
@@ -50,6 +218,7 @@ def admin_login():
         login_key = request.form.get('login_key')
         if login_key == ADMIN_KEY:
             session['admin_authenticated'] = True
+            session['client_id'] = secrets.token_urlsafe(8)
             return redirect(url_for('index'))
         else:
             return render_template('admin_login.html', error='Invalid admin key')
@@ -80,6 +249,7 @@ def agent_login():
         # Use secure credentials from environment variables
         if username == AGENT_USERNAME and password == AGENT_PASSWORD:
             session['agent_authenticated'] = True
+            session['client_id'] = secrets.token_urlsafe(8)  # Agents share a login; quotas and fair queuing go by session
             return redirect(url_for('agent'))
         else:
             return render_template('agent_login.html', error='Invalid credentials')
@@ -92,6 +262,31 @@ def agent_logout():
 
 # ===== API ROUTES =====
 
+def _actor():
+    """Who is making the current request, for access logs and activity stats"""
+    if session.get('admin_authenticated'):
+        return 'admin'
+    if session.get('agent_authenticated'):
+        return 'agent'
+    return 'system'
+
+def _client_id():
+    """Identity of the current browser session, assigned at login (or now, for sessions from before that)"""
+    if 'client_id' not in session:
+        session['client_id'] = secrets.token_urlsafe(8)
+    return session['client_id']
+
+def _quota_exceeded(retry_after, message):
+    retry_after = math.ceil(retry_after)
+    response = jsonify({"success": False, "error": f"{message}, retry in {retry_after}s", "retry_after": retry_after})
+    return response, 429, {'Retry-After': str(retry_after)}
+
+def _queue_intent(action, username, script_id, duration=None, error=None):
+    """Queue a grant or removal until TradingView recovers; returns its entry for the response"""
+    script = PineScript.get(script_id)
+    intent_id = pending_operations.enqueue(action, username, script_id, duration, _actor(), error)
+    return {"script_name": script.name if script else script_id, "intent_id": intent_id, "state": "pending"}
+
 @app.route('/api/validate-username', methods=['POST'])
 def validate_username():
     """Validate TradingView username"""
@@ -137,57 +332,85 @@ def grant_access():
         if not selected_scripts:
             return jsonify({"success": False, "error": "Please select at least one script"})
 
-        results = []
-        errors = []
+        # Agents share one login, so their quotas are per session; admins are not limited
+        quota_client = _client_id() if _actor() == 'agent' else None
+        if quota_client:
+            retry_after = agent_quotas.begin(quota_client, len(selected_scripts))
+            if retry_after is not None:
+                usage = agent_quotas.usage(quota_client)
+                return _quota_exceeded(retry_after, f"Agent quota exceeded ({usage['grants_used']}/"
+                                       f"{usage['grants_limit'] or 'unlimited'} scripts per {usage['window']}s, "
+                                       f"{usage['in_flight']} requests in flight)")
+        try:
+            return _grant_scripts(username, selected_scripts, duration)
+        finally:
+            if quota_client:
+                agent_quotas.end(quota_client)
 
-        for script_id in selected_scripts:
-            script = PineScript.get(script_id)
-            script_name = script.name if script else script_id
+    except Exception as e:
+        logger.error(f"Error granting access: {e}")
+        return jsonify({"success": False, "error": str(e)})
 
-            try:
-                # Grant access via TradingView API with duration
-                if duration == '1L':
-                    result = tv_api.add_pine_permission(username, script_id)
-                else:
-                    result = tv_api.grant_access(username, [script_id], duration)
-                    if isinstance(result, list) and len(result) > 0:
-                        result = result[0]
-                        result = {
-                            'success': result.get('status') == 'Success',
-                            'message': result.get('status', 'Unknown')
-                        }
+def _grant_scripts(username, selected_scripts, duration):
+    """Grant the scripts (or queue them while TradingView is down) and build the grant-access response"""
+    results = []
+    errors = []
+    queued = []
 
-                success = result.get('success', False)
-                status = "success" if success else "failure"
+    # Queue rather than call TradingView while it is down or an earlier intent for the script is waiting
+    live_scripts = selected_scripts
+    if Config.PENDING_QUEUE_ENABLED:
+        live_scripts = []
+        for script_id in selected_scripts:
+            if pending_operations.should_queue(username, script_id):
+                queued.append(_queue_intent("grant", username, script_id, duration))
+            else:
+                live_scripts.append(script_id)
 
-                # Log the operation
-                AccessLog.create(
-                    username=username,
-                    pine_id=script_id,
-                    pine_script_name=script_name,
-                    operation="grant",
-                    status=status,
-                    details=f"Duration: {duration}, {result.get('message', '')}"
-                )
+    # One batch for every selected script; lifetime and timed grants share the same path
+    for grant in tv_api.grant_many(username, live_scripts, duration):
+        script_id = grant['pine_id']
+        script = PineScript.get(script_id)
+        script_name = script.name if script else script_id
 
-                if success:
-                    results.append({"script_name": script_name, "success": True, "duration": duration})
-                else:
-                    errors.append({"script_name": script_name, "error": result.get('message', 'Unknown error')})
+        try:
+            if not grant['success'] and grant['retryable'] and Config.PENDING_QUEUE_ENABLED:
+                pending_operations.mark_upstream_down()
+                queued.append(_queue_intent("grant", username, script_id, duration, grant['message']))
+                continue
+
+            success = grant['success']
+            status = "success" if success else "failure"
+
+            if success:
+                user_access_index.record_access(username, script_id, True, grant['expiration'])
+
+            # Log the operation
+            AccessLog.create(
+                username=username,
+                pine_id=script_id,
+                pine_script_name=script_name,
+                operation="grant",
+                status=status,
+                details=f"Duration: {duration}, {grant['message']}",
+                actor=_actor()
+            )
 
-            except Exception as e:
-                logger.error(f"Error granting access to {script_name}: {e}")
-                errors.append({"script_name": script_name, "error": str(e)})
+            if success:
+                results.append({"script_name": script_name, "success": True, "duration": duration})
+            else:
+                errors.append({"script_name": script_name, "error": grant['message']})
 
-        return jsonify({
-            "success": len(results) > 0,
-            "results": results,
-            "errors": errors
-        })
+        except Exception as e:
+            logger.error(f"Error granting access to {script_name}: {e}")
+            errors.append({"script_name": script_name, "error": str(e)})
 
-    except Exception as e:
-        logger.error(f"Error granting access: {e}")
-        return jsonify({"success": False, "error": str(e)})
+    return jsonify({
+        "success": len(results) > 0 or len(queued) > 0,
+        "results": results,
+        "errors": errors,
+        "queued": queued
+    })
 
 @app.route('/api/remove-access', methods=['POST'])
 def remove_access():
@@ -200,9 +423,21 @@ def remove_access():
         if not username or not script_id:
             return jsonify({"success": False, "error": "Username and Script ID required"})
 
+        if Config.PENDING_QUEUE_ENABLED and pending_operations.should_queue(username, script_id):
+            return jsonify({"success": True, "message": "TradingView is unavailable, removal queued",
+                            "queued": _queue_intent("remove", username, script_id)})
+
         # Remove access via TradingView API
         result = tv_api.remove_pine_permission(username, script_id)
 
+        if not result.get('success', False) and result.get('retryable') and Config.PENDING_QUEUE_ENABLED:
+            pending_operations.mark_upstream_down()
+            return jsonify({"success": True, "message": "TradingView is unavailable, removal queued",
+                            "queued": _queue_intent("remove", username, script_id, error=result.get('message'))})
+
+        if result.get('success', False):
+            user_access_index.record_access(username, script_id, False)
+
         # Log the operation
         script = PineScript.get(script_id)
         script_name = script.name if script else script_id
@@ -213,7 +448,8 @@ def remove_access():
             pine_script_name=script_name,
             operation="remove",
             status="success" if result.get('success', False) else "failure",
-            details=result.get('message', 'Admin removal')
+            details=result.get('message', 'Admin removal'),
+            actor=_actor()
         )
 
         return jsonify({
@@ -228,8 +464,11 @@ def remove_access():
 def get_script_users(script_id):
     """Get all usernames that have access to a specific Pine Script"""
     try:
-        # Get users from TradingView API
-        users = tv_api.get_script_users(script_id)
+        # Reuse a live snapshot when the caller has one, otherwise fetch from TradingView
+        snapshot_id = request.args.get('snapshot', '')
+        users = user_snapshots.get(snapshot_id, script_id)
+        if users is None:
+            users, snapshot_id = _fetch_script_users_snapshot(script_id)
 
         script = PineScript.get(script_id)
         script_name = script.name if script else script_id
@@ -238,12 +477,19 @@ def get_script_users(script_id):
             "success": True,
             "script_id": script_id,
             "script_name": script_name,
-            "users": users
+            "snapshot_id": snapshot_id,
+            "total_users": len(users),
+            "users": filter_users(users, request.args.get('q', ''), request.args.get('type', ''))
         })
     except Exception as e:
         logger.error(f"Error getting script users: {e}")
         return jsonify({"success": False, "error": str(e)})
 
+def _fetch_script_users_snapshot(script_id):
+    """Fetch a script's users from TradingView, sync the index and store a snapshot"""
+    users = tv_api.get_script_users(script_id)  # Also syncs the index when the fetch completes
+    return users, user_snapshots.create(script_id, users)
+
 @app.route('/api/add-script', methods=['POST'])
 def add_script():
     """Add a new Pine Script"""
@@ -285,6 +531,8 @@ def remove_script():
         if not PineScript.delete(script_id):
             return jsonify({"success": False, "error": "Script not found"})
 
+        user_access_index.forget_script(script_id)
+
         return jsonify({"success": True})
     except Exception as e:
         logger.error(f"Error removing script: {e}")
@@ -297,6 +545,17 @@ def bulk_remove_access():
         data = request.get_json()
         usernames = data.get('usernames', [])
         script_id = data.get('script_id', '').strip()
+        snapshot_id = data.get('snapshot_id', '')
+
+        # "all_matching" selects every user of the snapshot that matches the modal's filter
+        if data.get('all_matching') and script_id:
+            snapshot_users = user_snapshots.get(snapshot_id, script_id)
+            if snapshot_users is None:
+                # Expired, or taken by another worker process; match against a fresh list instead
+                logger.info(f"User snapshot {snapshot_id or '-'} not found here, refetching users of {script_id}")
+                snapshot_users, snapshot_id = _fetch_script_users_snapshot(script_id)
+            matching = filter_users(snapshot_users, data.get('q', ''), data.get('type', ''))
+            usernames = [user['username'] for user in matching]
 
         if not usernames or not script_id:
             return jsonify({"success": False, "error": "Usernames and Script ID required"})
@@ -305,6 +564,7 @@ def bulk_remove_access():
         script_name = script.name if script else script_id
 
         removed_count = 0
+        removed = []
         errors = []
 
         for username in usernames:
@@ -312,6 +572,9 @@ def bulk_remove_access():
                 # Remove access via TradingView API
                 result = tv_api.remove_pine_permission(username, script_id)
 
+                if result.get('success', False):
+                    user_access_index.record_access(username, script_id, False)
+
                 # Log the operation
                 AccessLog.create(
                     username=username,
@@ -319,11 +582,13 @@ def bulk_remove_access():
                     pine_script_name=script_name,
                     operation="remove",
                     status="success" if result.get('success', False) else "failure",
-                    details=f"Bulk removal - {result.get('message', '')}"
+                    details=f"Bulk removal - {result.get('message', '')}",
+                    actor=_actor()
                 )
 
                 if result.get('success', False):
                     removed_count += 1
+                    removed.append(username)
                 else:
                     errors.append(f"{username}: {result.get('message', 'Unknown error')}")
 
@@ -331,6 +596,9 @@ def bulk_remove_access():
                 logger.error(f"Error removing access for {username}: {e}")
                 errors.append(f"{username}: {str(e)}")
 
+        if snapshot_id:
+            user_snapshots.remove_users(snapshot_id, removed)
+
         return jsonify({
             "success": removed_count > 0,
             "removed_count": removed_count,
@@ -342,6 +610,154 @@ def bulk_remove_access():
         logger.error(f"Error bulk removing access: {e}")
         return jsonify({"success": False, "error": str(e)})
 
+@app.route('/api/extend-access', methods=['POST'])
+def extend_access():
+    """Extend the expiration of a script's temporary users by a duration"""
+    # Admin only operation
+    if not session.get('admin_authenticated'):
+        return jsonify({"success": False, "error": "Admin authentication required"})
+
+    try:
+        data = request.get_json()
+        script_id = data.get('script_id', '').strip()
+        duration = data.get('duration', '').strip()
+
+        if not script_id or not TIMED_DURATION.match(duration):
+            error = "Script ID and a timed duration in days, months or years (e.g. 30D, 6M, 1Y) are required"
+            return jsonify({"success": False, "error": error}), 400
+
+        plan = plan_extension(script_id, duration, data.get('q', ''), data.get('usernames'), data.get('snapshot_id', ''))
+
+        if data.get('dry_run'):
+            return jsonify({"success": True, "dry_run": True, "total": len(plan), "plan": plan})
+
+        if not plan:
+            return jsonify({"success": False, "error": "No temporary users match"})
+
+        job = extension_jobs.start(script_id, duration, plan)
+        return jsonify({"success": True, "job_id": job.id, "total": len(plan)})
+
+    except Exception as e:
+        logger.error(f"Error extending access: {e}")
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route('/api/extend-access/<job_id>')
+def extend_access_progress(job_id):
+    """Progress of a bulk extension job"""
+    if not session.get('admin_authenticated'):
+        return jsonify({"success": False, "error": "Admin authentication required"})
+
+    job = extension_jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Extension job not found"})
+    return jsonify({"success": True, **job.progress()})
+
+@app.route('/api/purge', methods=['POST'])
+def start_purge():
+    """Start a purge sweep of expired and blocked grants (resumes an interrupted one of the same mode)"""
+    if not session.get('admin_authenticated'):
+        return jsonify({"success": False, "error": "Admin authentication required"})
+
+    data = request.get_json(silent=True) or {}
+    dry_run = data.get('dry_run')
+    if not purge_scheduler.start_sweep(None if dry_run is None else bool(dry_run)):
+        return jsonify({"success": False, "error": "A purge sweep is already running"})
+    return jsonify({"success": True})
+
+@app.route('/api/purge')
+def purge_status():
+    """Progress of the current purge sweep, or the summary of the last one"""
+    if not session.get('admin_authenticated'):
+        return jsonify({"success": False, "error": "Admin authentication required"})
+
+    return jsonify({"success": True, "sweep": purge_scheduler.status()})
+
+@app.route('/api/stats')
+def activity_statistics():
+    """Hourly or daily grant, removal and failure counts, optionally for one script or actor"""
+    if not session.get('admin_authenticated'):
+        return jsonify({"success": False, "error": "Admin authentication required"})
+
+    resolution = request.args.get('resolution', 'hour')
+    if resolution not in RESOLUTIONS:
+        return jsonify({"success": False, "error": "resolution must be 'hour' or 'day'"})
+    script_id = request.args.get('script_id') or None
+    actor = request.args.get('actor') or None
+    if script_id and actor:
+        return jsonify({"success": False, "error": "Filter by script_id or actor, not both"})
+    buckets = request.args.get('buckets', type=int) or (24 if resolution == 'hour' else 30)
+
+    return jsonify({"success": True, **activity_stats.query(resolution, buckets, script_id, actor)})
+
+@app.route('/api/access-logs/search')
+def search_access_logs():
+    """Ranked, paginated full-text search over access logs (username, script name and details)"""
+    if not session.get('admin_authenticated'):
+        return jsonify({"success": False, "error": "Admin authentication required"})
+    if not audit_search.enabled:
+        return jsonify({"success": False, "error": "Audit search is disabled"})
+
+    try:
+        # Timestamps are stored in UTC; dates or datetimes are accepted
+        since = datetime.fromisoformat(request.args['since']) if request.args.get('since') else None
+        until = datetime.fromisoformat(request.args['until']) if request.args.get('until') else None
+    except ValueError:
+        return jsonify({"success": False, "error": "since and until must be ISO dates, e.g. 2026-09-01"})
+
+    found = audit_search.search(
+        query=request.args.get('q', ''),
+        username=request.args.get('username', '').strip(),
+        operation=request.args.get('operation', ''),
+        status=request.args.get('status', ''),
+        actor=request.args.get('actor', ''),
+        since=since,
+        until=until,
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', 50, type=int)
+    )
+
+    response = {"success": True, **found}
+    if request.args.get('html'):
+        response['access_logs_html'] = render_template('partials/access_logs.html', access_logs=found['results'])
+    response['results'] = [{**result, 'timestamp': result['timestamp'].isoformat()} for result in found['results']]
+    return jsonify(response)
+
+@app.route('/api/upstream-queue')
+def upstream_queue_status():
+    """Fair-queue occupancy per TradingView account and agent quota usage"""
+    if not session.get('admin_authenticated'):
+        return jsonify({"success": False, "error": "Admin authentication required"})
+
+    return jsonify({
+        "success": True,
+        "accounts": [client.scheduler.stats() for client in tv_api.get().clients.values()],
+        "quotas": agent_quotas.stats()
+    })
+
+@app.route('/api/pending-operations')
+def pending_operations_status():
+    """Depth of the queue of grants and removals waiting for TradingView, with the newest intents"""
+    if not session.get('admin_authenticated'):
+        return jsonify({"success": False, "error": "Admin authentication required"})
+
+    state = request.args.get('state', '')
+    if state and state not in INTENT_STATES:
+        return jsonify({"success": False, "error": f"state must be one of {', '.join(INTENT_STATES)}"})
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+
+    return jsonify({"success": True, **pending_operations.stats(), "intents": pending_operations.list(state, limit)})
+
+@app.route('/api/pending-operations/<int:intent_id>')
+def pending_operation(intent_id):
+    """State of one queued grant or removal"""
+    if not (session.get('admin_authenticated') or session.get('agent_authenticated')):
+        return jsonify({"success": False, "error": "Authentication required"})
+
+    intent = pending_operations.get(intent_id)
+    if intent is None:
+        return jsonify({"success": False, "error": "Unknown intent"})
+    return jsonify({"success": True, "intent": intent})
+
 @app.route('/api/get-scripts')
 def get_scripts():
     """Get all available scripts for real-time updates"""
@@ -384,6 +800,7 @@ def toggle_agent_visibility():
             return jsonify({"success": False, "error": "Script not found"})
         
         script.is_visible_to_agent = not script.is_visible_to_agent
+        PineScript.bump_version()
         
         return jsonify({
             "success": True,
@@ -422,8 +839,11 @@ def get_agent_scripts():
 def export_script_users(script_id):
     """Export all usernames that have access to a specific Pine Script as text file"""
     try:
-        # Get users from TradingView API
-        users = tv_api.get_script_users(script_id)
+        # Export the snapshot the modal showed when it is still live
+        users = user_snapshots.get(request.args.get('snapshot', ''), script_id)
+        if users is None:
+            users, _ = _fetch_script_users_snapshot(script_id)
+        users = filter_users(users, request.args.get('q', ''), request.args.get('type', ''))
 
         script = PineScript.get(script_id)
         script_name = script.name if script else script_id
@@ -480,6 +900,90 @@ def export_script_users(script_id):
             headers={"Content-disposition": f"attachment; filename=export_error.txt"}
         )
 
+@app.route('/api/user-lookup')
+def user_lookup():
+    """Answer which catalog scripts a user has access to from the local user index"""
+    if not (session.get('admin_authenticated') or session.get('agent_authenticated')):
+        return jsonify({"success": False, "error": "Authentication required"})
+
+    try:
+        username = request.args.get('username', '').strip()
+        refresh = request.args.get('refresh', '0') == '1'
+
+        if not username:
+            return jsonify({"success": False, "error": "Username is required"})
+
+        pine_ids = [script.pine_id for script in PineScript.get_all()]
+        results, stale = user_access_index.lookup(username, pine_ids)
+
+        # Fall back to concurrent upstream checks for scripts whose index entry is stale
+        if stale and refresh:
+            for access in tv_api.get_user_access(username, stale):
+                if not access.get('checked'):
+                    continue
+                expiration = None if access['noExpiration'] else access['currentExpiration']
+                user_access_index.record_access(username, access['pine_id'], access['hasAccess'], expiration)
+            results, stale = user_access_index.lookup(username, pine_ids)
+
+        for access in results:
+            script = PineScript.get(access['pine_id'])
+            access['script_name'] = script.name if script else access['pine_id']
+
+        return jsonify({
+            "success": True,
+            "username": username,
+            "access": [access for access in results if access['hasAccess']],
+            "stale_scripts": stale
+        })
+    except Exception as e:
+        logger.error(f"Error looking up user access: {e}")
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route('/api/sync-user-index', methods=['POST'])
+def sync_user_index():
+    """Rebuild the user index from the full user list of every catalog script"""
+    # Admin only operation
+    if not session.get('admin_authenticated'):
+        return jsonify({"success": False, "error": "Admin authentication required"})
+
+    try:
+        synced = 0
+        for script in PineScript.get_all():
+            started = time.time()
+            tv_api.get_script_users(script.pine_id)
+            if user_access_index.synced_at(script.pine_id) >= started:
+                synced += 1
+
+        return jsonify({"success": True, "synced_scripts": synced, "index": user_access_index.stats()})
+    except Exception as e:
+        logger.error(f"Error syncing user index: {e}")
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route('/api/profiles')
+def list_profiles():
+    """List recently saved request profiles"""
+    # Admin only operation
+    if not session.get('admin_authenticated'):
+        return jsonify({"success": False, "error": "Admin authentication required"})
+
+    try:
+        return jsonify({"success": True, "profiles": profiling.list_profiles()})
+    except Exception as e:
+        logger.error(f"Error listing profiles: {e}")
+        return jsonify({"success": False, "error": str(e)})
+
+@app.route('/api/profiles/<name>')
+def download_profile(name):
+    """Download a saved request profile"""
+    # Admin only operation
+    if not session.get('admin_authenticated'):
+        return jsonify({"success": False, "error": "Admin authentication required"})
+
+    if not profiling.is_profile_name(name):
+        return jsonify({"success": False, "error": "Profile not found"})
+
+    return send_from_directory(os.path.abspath(Config.PROFILE_DIR), name, as_attachment=True)
+
 # ===== REDIRECT ROUTES =====
 
 @app.route('/admin')
@@ -0,0 +1,69 @@
+"""Single-flight coalescing of identical concurrent calls.
+
+While a call for a key is in flight, further callers with the same key wait
+for its result (or exception) instead of starting their own. Nothing is
+cached: once the call finishes the key is forgotten and the next caller
+starts a fresh one.
+"""
+import logging
+import threading
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
+
+class SingleFlightTimeout(TimeoutError):
+    """A caller gave up waiting for an in-flight call"""
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Share one in-flight call per key between concurrent callers"""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, timeout=None):
+        """Run func() for key, or wait up to timeout seconds for the call already in flight"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            metrics.singleflight_calls_total.inc(group=self.name, role="follower")
+            with tracing.span(f"singleflight.{self.name}", "wait"):
+                finished = call.done.wait(timeout)
+            if not finished:
+                raise SingleFlightTimeout(f"Timed out after {timeout}s waiting for {self.name} {key!r}")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        metrics.singleflight_calls_total.inc(group=self.name, role="leader")
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            if call.waiters:
+                logger.debug("Shared %s %r with %s waiting callers", self.name, key, call.waiters)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
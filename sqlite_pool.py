@@ -0,0 +1,77 @@
+"""Bounded pool of SQLite connections shared by every thread and greenlet of a process.
+
+A connection per thread (threading.local) turns into a connection, and a
+schema script, per greenlet under gevent or eventlet workers. The pool opens
+at most `size` connections per process, lazily, runs the schema once, and
+hands them out one borrower at a time. An in-memory database gets a single
+connection, since every connection to ":memory:" is a separate database.
+"""
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DEFAULT_SIZE = 4
+
+class SQLitePool:
+    """Lazily opened connections to one database file, reopened after a fork"""
+
+    def __init__(self, path, schema, pragmas=(), size=DEFAULT_SIZE):
+        self.path = path
+        self.schema = schema
+        self.pragmas = pragmas
+        self.size = 1 if path == ':memory:' else max(1, size)
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._schema_ready = False
+        self._lock = threading.Lock()
+
+    def _open(self):
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        with self._lock:
+            if not self._schema_ready:
+                conn.executescript(self.schema)
+                self._schema_ready = True
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if not can_open:
+            return self._idle.get()
+        try:
+            return self._open()
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of the block"""
+        if self._pid != os.getpid():
+            self._reset()  # Connections inherited from the parent process must not be used
+        pid = self._pid
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if pid == self._pid:
+                self._idle.put(conn)
@@ -0,0 +1,165 @@
+"""Lightweight request-scoped tracing.
+
+A trace is started for every Flask request and kept in a context variable,
+so TradingViewAPI can record spans without knowing about Flask. Spans are
+summarized in the Server-Timing response header, and traces of requests
+slower than TRACE_SLOW_THRESHOLD_MS are appended to an OTLP/JSON file
+(one ExportTraceServiceRequest per line, as written by the OpenTelemetry
+file exporter).
+"""
+import contextvars
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_current_span_id = contextvars.ContextVar('current_span_id', default=None)
+_export_lock = threading.Lock()
+
+class Span:
+    """A timed operation within a trace"""
+
+    __slots__ = ('span_id', 'parent_id', 'name', 'category', 'start', 'end', 'attributes')
+
+    def __init__(self, name, category, parent_id, attributes):
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.category = category
+        self.start = time.time()
+        self.end = None
+        self.attributes = attributes
+
+    @property
+    def duration(self):
+        return (self.end or time.time()) - self.start
+
+class Trace:
+    """Spans recorded while handling one request"""
+
+    def __init__(self, name):
+        self.trace_id = secrets.token_hex(16)
+        self.name = name
+        self.root = Span(name, 'request', None, {})
+        self.spans = []
+
+    def finish(self):
+        self.root.end = time.time()
+
+def start_trace(name):
+    """Start a trace for the current context and return (trace, reset token)"""
+    trace = Trace(name)
+    return trace, (_current_trace.set(trace), _current_span_id.set(trace.root.span_id))
+
+def end_trace(token):
+    trace_token, span_token = token
+    _current_trace.reset(trace_token)
+    _current_span_id.reset(span_token)
+
+def current_trace():
+    return _current_trace.get()
+
+@contextmanager
+def span(name, category, **attributes):
+    """Record a span in the current trace; a no-op outside of a trace"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    item = Span(name, category, _current_span_id.get(), attributes)
+    token = _current_span_id.set(item.span_id)
+    try:
+        yield item
+    finally:
+        item.end = time.time()
+        _current_span_id.reset(token)
+        trace.spans.append(item)
+
+def wrap(func):
+    """Bind func to the current trace so it can run on an executor thread"""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return run
+
+def server_timing(trace):
+    """Summarize a trace as a Server-Timing header value"""
+    totals = {}
+    for item in trace.spans:
+        name = item.name.replace(' ', '_')
+        duration, count = totals.get(name, (0.0, 0))
+        totals[name] = (duration + item.duration, count + 1)
+
+    entries = [f'{name};dur={duration * 1000:.1f};desc="{count}x"'
+               for name, (duration, count) in sorted(totals.items(), key=lambda kv: -kv[1][0])]
+    entries.append(f'total;dur={trace.root.duration * 1000:.1f}')
+    return ', '.join(entries)
+
+def _otlp_attributes(attributes):
+    result = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            result.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            result.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            result.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            result.append({"key": key, "value": {"stringValue": str(value)}})
+    return result
+
+def _otlp_span(trace, item):
+    data = {
+        "traceId": trace.trace_id,
+        "spanId": item.span_id,
+        "name": item.name,
+        "kind": 2 if item.category == 'request' else 3,  # SERVER or CLIENT
+        "startTimeUnixNano": str(int(item.start * 1e9)),
+        "endTimeUnixNano": str(int((item.end or time.time()) * 1e9)),
+        "attributes": _otlp_attributes(dict(item.attributes, category=item.category))
+    }
+    if item.parent_id:
+        data["parentSpanId"] = item.parent_id
+    return data
+
+def to_otlp(trace):
+    """Convert a trace to an OTLP/JSON ExportTraceServiceRequest"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": "tradingview-access-manager"})},
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [_otlp_span(trace, trace.root)] + [_otlp_span(trace, item) for item in trace.spans]
+            }]
+        }]
+    }
+
+def export_if_slow(trace):
+    """Append the trace to the OTLP file sink when it exceeds the slow threshold"""
+    if not Config.TRACE_EXPORT_FILE or trace.root.duration * 1000 < Config.TRACE_SLOW_THRESHOLD_MS:
+        return False
+    try:
+        line = json.dumps(to_otlp(trace))
+        with _export_lock:
+            directory = os.path.dirname(Config.TRACE_EXPORT_FILE)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Keep one rotated file so the sink stays bounded
+            if os.path.exists(Config.TRACE_EXPORT_FILE) and \
+               os.path.getsize(Config.TRACE_EXPORT_FILE) > Config.TRACE_EXPORT_MAX_BYTES:
+                os.replace(Config.TRACE_EXPORT_FILE, f"{Config.TRACE_EXPORT_FILE}.1")
+            with open(Config.TRACE_EXPORT_FILE, 'a') as f:
+                f.write(line + '\n')
+        return True
+    except Exception as e:
+        logger.error(f"Error exporting slow trace: {e}")
+        return False
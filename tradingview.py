@@ -4,22 +4,204 @@ import logging
 import os
 import time
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from config import Config
+from concurrency import cooperative_mode
+import metrics
+import tracing
+from singleflight import SingleFlight, SingleFlightTimeout
+from fair_queue import FairScheduler
 
 logger = logging.getLogger(__name__)
 
+# CSRF token patterns per page, compiled once and matched against raw bytes as they stream in
+CSRF_PATTERNS = {
+    "signin": [re.compile(pattern) for pattern in (
+        rb'name="authenticity_token"[^>]*value="([^"]+)"',
+        rb'"csrf_token":"([^"]+)"',
+        rb'window\._csrf = "([^"]+)"',
+        rb'csrf_token["\']:\s*["\']([^"\']+)["\']'
+    )],
+    "chart": [re.compile(pattern) for pattern in (
+        rb'window\.__csrfToken\s*=\s*["\']([^"\']+)["\']',
+        rb'csrfToken["\']?\s*:\s*["\']([^"\']+)["\']',
+        rb'csrf_token["\']?\s*:\s*["\']([^"\']+)["\']',
+        rb'authenticity_token["\']?\s*["\']([^"\']+)["\']'
+    )]
+}
+CSRF_PAGES = {
+    "signin": ("signin_page", "/accounts/signin/"),
+    "chart": ("chart_csrf", "/chart/")
+}
+CSRF_SCAN_CHUNK = 16 * 1024
+CSRF_SCAN_OVERLAP = 512  # Bytes carried between chunks so a token split across them still matches
+CSRF_SCAN_LIMIT = 4 * 1024 * 1024
+
+def scan_for_token(response, patterns):
+    """Read a streamed response chunk by chunk and return the first token match, closing it early"""
+    buffer = b''
+    scanned = 0
+    try:
+        for chunk in response.iter_content(chunk_size=CSRF_SCAN_CHUNK):
+            buffer = buffer[-CSRF_SCAN_OVERLAP:] + chunk
+            for pattern in patterns:
+                match = pattern.search(buffer)
+                if match:
+                    return match.group(1).decode('utf-8', 'replace')
+            scanned += len(chunk)
+            if scanned >= CSRF_SCAN_LIMIT:
+                break
+    finally:
+        response.close()
+    return None
+
+def _is_transient(status_code=None, error=None):
+    """Whether a failed call is worth retrying later (TradingView unavailable rather than refusing)"""
+    if error is not None:
+        return isinstance(error, requests.RequestException)
+    return status_code == 429 or status_code >= 500
+
+def _account_session_file(name):
+    """Session file of an account: TRADINGVIEW_SESSION_FILE, suffixed with the name for extra accounts"""
+    if name == 'default':
+        return Config.TRADINGVIEW_SESSION_FILE
+    base, extension = os.path.splitext(Config.TRADINGVIEW_SESSION_FILE)
+    return f"{base}_{name}{extension}"
+
+def load_accounts():
+    """Read the extra owner accounts from TRADINGVIEW_ACCOUNTS (inline JSON or a JSON file path)"""
+    value = Config.TRADINGVIEW_ACCOUNTS.strip()
+    if not value:
+        return []
+    try:
+        if value.startswith('['):
+            accounts = json.loads(value)
+        else:
+            with open(value) as f:
+                accounts = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error("Error loading TradingView accounts: %s", e)
+        return []
+
+    valid = []
+    for account in accounts:
+        if not account.get('name') or not account.get('username') or account['name'] == 'default':
+            logger.error("Skipping TradingView account without a unique name and username: %s", account.get('name'))
+            continue
+        valid.append(account)
+    return valid
+
+class CsrfTokenManager:
+    """Caches the CSRF token with the session and refetches it only after an auth or CSRF failure"""
+
+    def __init__(self, client):
+        self.client = client
+        self.token = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, page="signin"):
+        """Return the cached token, fetching one from the given page if there is none"""
+        token = self.token
+        if token:
+            return token
+        return self.refresh(page)
+
+    def invalidate(self):
+        self.token = None
+
+    def refresh(self, page="signin"):
+        """Fetch a new token; concurrent callers share a single fetch"""
+        generation = self._generation
+        with self._lock:
+            if self._generation != generation and self.token:
+                return self.token
+            token = self._fetch(page)
+            if token is None:
+                # Fall back to a CSRF cookie set by the upstream
+                for cookie in self.client.session.cookies:
+                    if 'csrf' in cookie.name.lower():
+                        token = cookie.value
+                        logger.debug("CSRF token found in cookie: %s", cookie.name)
+                        break
+            self.token = token
+            self._generation += 1
+            return token
+
+    def _fetch(self, page):
+        endpoint, path = CSRF_PAGES[page]
+        try:
+            response = self.client._request("GET", endpoint, f"{self.client.base_url}{path}", stream=True)
+            if response.status_code != 200:
+                response.close()
+                logger.error("Failed to access %s page for CSRF token: %s", page, response.status_code)
+                return None
+            token = scan_for_token(response, CSRF_PATTERNS[page])
+            if token:
+                logger.debug("CSRF token extracted from %s page", page)
+            return token
+        except Exception as e:
+            logger.debug("Error getting CSRF token from %s page: %s", page, e)
+            return None
+
+class RateBudget:
+    """Token bucket limiting one account's upstream request rate"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate  # Requests per second, 0 disables the budget
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return how many seconds the caller must wait before using it"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
 class TradingViewAPI:
     """TradingView API client for managing script access"""
 
-    def __init__(self):
+    def __init__(self, account=None):
+        # account: an entry of TRADINGVIEW_ACCOUNTS; None uses the default TRADINGVIEW_* settings
+        account = account or {}
+        self.name = account.get('name', 'default')
         self.base_url = Config.TRADINGVIEW_BASE_URL
-        self.username = Config.TRADINGVIEW_USERNAME
-        self.password = Config.TRADINGVIEW_PASSWORD
+        self.username = account.get('username', Config.TRADINGVIEW_USERNAME)
+        if account:
+            self.password = account.get('password') or os.getenv(account.get('password_env', ''), '')
+        else:
+            self.password = Config.TRADINGVIEW_PASSWORD
+        self.rate_budget = RateBudget(float(account.get('rate_limit', Config.TRADINGVIEW_RATE_LIMIT)),
+                                      int(account.get('rate_burst', Config.TRADINGVIEW_RATE_BURST)))
+        self.scheduler = FairScheduler(int(account.get('concurrency', Config.UPSTREAM_CONCURRENCY)), self.name)
         self.session = requests.Session()
-        self.session_file = "session.txt"
-        self.csrf_token = None
+        # Size the pool for concurrent upstream calls so connections are reused, not re-opened.
+        # Green-thread workers run many requests per process, so they get a larger pool.
+        pool_size = max(10, Config.TRADINGVIEW_MAX_WORKERS)
+        if cooperative_mode():
+            pool_size = max(pool_size, Config.COOPERATIVE_POOL_SIZE)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session_file = account.get('session_file') or _account_session_file(self.name)
+        self.csrf = CsrfTokenManager(self)
         self.session_hash = None
+        self._auth_verified_at = None
+        self._auth_lock = threading.Lock()
+        # Concurrent identical reads (e.g. users modal and export) share one upstream fetch
+        self._script_users_flights = SingleFlight("get_script_users")
+        self._validate_flights = SingleFlight("validate_username")
         self._setup_session()
         self._load_session()
 
@@ -35,6 +217,57 @@ class TradingViewAPI:
             'Upgrade-Insecure-Requests': '1',
         })
 
+    def _request(self, method, endpoint, url, **kwargs):
+        """Send an upstream request in its session's fair share, recording per-endpoint count and latency metrics"""
+        with self.scheduler.slot():
+            # The budget is drawn inside the slot, so under a rate limit tokens also go out in fair order
+            wait = self.rate_budget.reserve()
+            if wait > 0:
+                self._pace(wait, "account_budget")
+            return self._send(method, endpoint, url, **kwargs)
+
+    def _send(self, method, endpoint, url, **kwargs):
+        start = time.perf_counter()
+        status = "error"
+        with tracing.span(f"tv.{endpoint}", "upstream", method=method, account=self.name) as span:
+            try:
+                response = self.session.request(method, url, **kwargs)
+                status = str(response.status_code)
+                if response.status_code in (401, 403) or 'accounts/signin' in response.headers.get('Location', ''):
+                    self._auth_verified_at = None  # Re-probe the session before the next call
+                return response
+            finally:
+                elapsed = time.perf_counter() - start
+                metrics.tradingview_requests_total.inc(endpoint=endpoint, status=status)
+                metrics.tradingview_request_duration_seconds.observe(elapsed, endpoint=endpoint, status=status)
+                if span is not None:
+                    span.attributes['http.status_code'] = status
+
+    def _session_request(self, method, endpoint, url, headers, **kwargs):
+        """Send a request carrying the session cookie, retrying once if it is rate limited or rejected"""
+        response = self._request(method, endpoint, url, headers=headers, **kwargs)
+        if response.status_code == 429:
+            # Rate limited upstream: honour a short Retry-After once, then report the 429
+            retry_after = response.headers.get('Retry-After', '1')
+            delay = min(float(retry_after), 10.0) if retry_after.replace('.', '', 1).isdigit() else 1.0
+            metrics.tradingview_retries_total.inc(endpoint=endpoint)
+            self._pace(delay, "rate_limited")
+            response = self._request(method, endpoint, url, headers=headers, **kwargs)
+        if response.status_code in (401, 403):
+            # Retry only when the session had expired and a sign-in replaced it; a 403 for a
+            # still-valid session is a real permission error and is returned as is
+            sent = headers.get('Cookie')
+            if self._ensure_authenticated() and f'sessionid={self._get_session_id()}' != sent:
+                headers['Cookie'] = f'sessionid={self._get_session_id()}'
+                response = self._request(method, endpoint, url, headers=headers, **kwargs)
+        return response
+
+    def _pace(self, seconds, reason):
+        """Sleep between upstream requests, recording the time spent waiting"""
+        with tracing.span(f"wait.{reason}", "wait"):
+            time.sleep(seconds)
+        metrics.tradingview_rate_limit_wait_seconds_total.inc(seconds, reason=reason)
+
     def _load_session(self):
         """Load session from file if exists"""
         try:
@@ -44,9 +277,10 @@ class TradingViewAPI:
                     # Set cookies from saved session
                     for cookie_data in session_data.get('cookies', []):
                         self.session.cookies.set(**cookie_data)
+                    self.csrf.token = session_data.get('csrf_token')
                 logger.info("Session loaded from file")
         except Exception as e:
-            logger.error(f"Error loading session: {e}")
+            logger.error("Error loading session: %s", e)
 
     def _save_session(self):
         """Save current session to file"""
@@ -62,6 +296,7 @@ class TradingViewAPI:
 
             session_data = {
                 'cookies': cookies_data,
+                'csrf_token': self.csrf.token,
                 'timestamp': datetime.now().isoformat()
             }
 
@@ -69,101 +304,112 @@ class TradingViewAPI:
                 json.dump(session_data, f)
             logger.info("Session saved to file")
         except Exception as e:
-            logger.error(f"Error saving session: {e}")
+            logger.error("Error saving session: %s", e)
 
     def _authenticate(self):
         """Authenticate with TradingView"""
+        with tracing.span("auth.signin", "auth"):
+            return self._sign_in()
+
+    def _sign_in(self):
+        """Sign in with the configured credentials and save the session"""
         try:
-            # First, get the login page to get CSRF token
-            login_page = self.session.get(f"{self.base_url}/accounts/signin/")
-            if login_page.status_code != 200:
-                logger.error("Failed to access login page")
-                return False
-
-            # Extract CSRF token from the login page
-            csrf_patterns = [
-                r'name="authenticity_token"[^>]*value="([^"]+)"',
-                r'"csrf_token":"([^"]+)"',
-                r'window\._csrf = "([^"]+)"',
-                r'csrf_token["\']:\s*["\']([^"\']+)["\']'
-            ]
-
-            for pattern in csrf_patterns:
-                csrf_match = re.search(pattern, login_page.text)
-                if csrf_match:
-                    self.csrf_token = csrf_match.group(1)
-                    logger.debug(f"Found CSRF token with pattern: {pattern[:20]}...")
-                    break
-
-            if not self.csrf_token:
+            # Reuse the cached CSRF token; the sign-in page is only fetched when there is none
+            cached = self.csrf.token is not None
+            token = self.csrf.get("signin")
+            if not token:
                 logger.warning("Could not find CSRF token")
 
-            # Prepare login data
-            login_data = {
-                'username': self.username,
-                'password': self.password,
-                'remember': 'on',
-                'return_to': '/'
-            }
-
-            if self.csrf_token:
-                login_data['authenticity_token'] = self.csrf_token
-
-            # Set headers for login
-            login_headers = {
-                'Referer': f"{self.base_url}/accounts/signin/",
-                'Origin': self.base_url,
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
+            if self._post_sign_in(token):
+                return True
 
-            # Attempt login
-            response = self.session.post(
-                f"{self.base_url}/accounts/signin/",
-                data=login_data,
-                headers=login_headers,
-                allow_redirects=False  # Don't follow redirects to see the response
-            )
+            if cached:
+                # The cached token may have gone stale; fetch a fresh one and retry once
+                logger.info("Sign-in with cached CSRF token failed, retrying with a fresh token")
+                self.csrf.invalidate()
+                return self._post_sign_in(self.csrf.refresh("signin"))
+            return False
 
-            logger.debug(f"Login response status: {response.status_code}")
-            logger.debug(f"Login response headers: {dict(response.headers)}")
+        except Exception as e:
+            logger.error("Authentication error: %s", e)
+            return False
 
-            # Check if login was successful (usually a redirect or JSON response)
-            if response.status_code in [302, 303, 200]:
-                # Follow the redirect or check for success indicators
-                if response.status_code in [302, 303]:
-                    redirect_url = response.headers.get('Location', '/')
-                    if '/accounts/signin' not in redirect_url:
-                        logger.info("Authentication successful - redirected to main site")
+    def _post_sign_in(self, csrf_token):
+        """Post the sign-in form; returns True when the login succeeded"""
+        # Prepare login data
+        login_data = {
+            'username': self.username,
+            'password': self.password,
+            'remember': 'on',
+            'return_to': '/'
+        }
+
+        if csrf_token:
+            login_data['authenticity_token'] = csrf_token
+
+        # Set headers for login
+        login_headers = {
+            'Referer': f"{self.base_url}/accounts/signin/",
+            'Origin': self.base_url,
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+
+        # Attempt login
+        response = self._request(
+            "POST", "signin",
+            f"{self.base_url}/accounts/signin/",
+            data=login_data,
+            headers=login_headers,
+            allow_redirects=False  # Don't follow redirects to see the response
+        )
+
+        logger.debug("Login response status: %s", response.status_code)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Login response headers: %s", dict(response.headers))
+
+        # Check if login was successful (usually a redirect or JSON response)
+        if response.status_code in [302, 303, 200]:
+            # Follow the redirect or check for success indicators
+            if response.status_code in [302, 303]:
+                redirect_url = response.headers.get('Location', '/')
+                if '/accounts/signin' not in redirect_url:
+                    logger.info("Authentication successful - redirected to main site")
+                    self._save_session()
+                    return True
+            elif response.status_code == 200:
+                # Check for JSON response with user data (indicates successful login)
+                try:
+                    json_data = response.json()
+                    if 'user' in json_data and json_data['user'].get('username'):
+                        logger.info("Authentication successful - logged in as %s", json_data['user']['username'])
+                        self._save_session()
+                        return True
+                    elif json_data.get('error'):
+                        logger.error("Authentication failed - %s", json_data['error'])
+                        return False
+                except json.JSONDecodeError:
+                    # Not JSON, check HTML content for success indicators
+                    if 'error' not in response.text.lower() and \
+                       ('dashboard' in response.text.lower() or 'chart' in response.text.lower()):
+                        logger.info("Authentication successful - logged in")
                         self._save_session()
                         return True
-                elif response.status_code == 200:
-                    # Check for JSON response with user data (indicates successful login)
-                    try:
-                        json_data = response.json()
-                        if 'user' in json_data and json_data['user'].get('username'):
-                            logger.info(f"Authentication successful - logged in as {json_data['user']['username']}")
-                            self._save_session()
-                            return True
-                        elif json_data.get('error'):
-                            logger.error(f"Authentication failed - {json_data['error']}")
-                            return False
-                    except json.JSONDecodeError:
-                        # Not JSON, check HTML content for success indicators
-                        if 'error' not in response.text.lower() and \
-                           ('dashboard' in response.text.lower() or 'chart' in response.text.lower()):
-                            logger.info("Authentication successful - logged in")
-                            self._save_session()
-                            return True
-
-            logger.error("Authentication failed - login unsuccessful")
-            logger.debug(f"Response content snippet: {response.text[:500]}")
-            return False
 
-        except Exception as e:
-            logger.error(f"Authentication error: {e}")
-            return False
+        logger.error("Authentication failed - login unsuccessful")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Response content snippet: %s", response.text[:500])
+        return False
 
     def validate_username(self, username):
+        """Validate if a TradingView username exists, sharing the lookup with concurrent identical calls"""
+        try:
+            return self._validate_flights.do(username.lower(), lambda: self._validate_username(username),
+                                             timeout=Config.SINGLE_FLIGHT_TIMEOUT)
+        except SingleFlightTimeout as e:
+            logger.error("Username validation error: %s", e)
+            return {"validuser": False, "verifiedUserName": ""}
+
+    def _validate_username(self, username):
         """Validate if a TradingView username exists using real TradingView API"""
         try:
             if not self._ensure_authenticated():
@@ -171,7 +417,7 @@ class TradingViewAPI:
 
             # Use TradingView's username hint API for accurate validation
             hint_url = f"{self.base_url}/username_hint/?s={username}"
-            response = self.session.get(hint_url)
+            response = self._request("GET", "username_hint", hint_url)
 
             if response.status_code == 200:
                 users_list = response.json()
@@ -182,17 +428,17 @@ class TradingViewAPI:
                     if user['username'].lower() == username.lower():
                         valid_user = True
                         verified_name = user['username']
-                        logger.info(f"Username validation successful: {verified_name}")
+                        logger.info("Username validation successful: %s", verified_name)
                         return {"validuser": True, "verifiedUserName": verified_name}
 
-                logger.warning(f"Username validation failed for: {username}")
+                logger.warning("Username validation failed for: %s", username)
                 return {"validuser": False, "verifiedUserName": ""}
             else:
-                logger.error(f"Username hint API returned status: {response.status_code}")
+                logger.error("Username hint API returned status: %s", response.status_code)
                 return {"validuser": False, "verifiedUserName": ""}
 
         except Exception as e:
-            logger.error(f"Username validation error: {e}")
+            logger.error("Username validation error: %s", e)
             return {"validuser": False, "verifiedUserName": ""}
 
     def get_user_access(self, username, pine_ids):
@@ -201,143 +447,224 @@ class TradingViewAPI:
             if not self._ensure_authenticated():
                 return []
 
-            results = []
-            for pine_id in pine_ids:
-                # Use TradingView's list_users API to check access
-                list_users_url = f"{self.base_url}/pine_perm/list_users/?limit=10&order_by=-created"
+            if not pine_ids:
+                return []
 
-                from urllib3 import encode_multipart_formdata
-                payload = {
-                    'pine_id': pine_id,
-                    'username': username
-                }
+            # Check every script concurrently instead of one list_users call after another
+            workers = max(1, min(Config.TRADINGVIEW_MAX_WORKERS, len(pine_ids)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                check = tracing.wrap(lambda pine_id: self._check_user_access(username, pine_id))
+                return list(executor.map(check, pine_ids))
 
-                body, content_type = encode_multipart_formdata(payload)
+        except Exception as e:
+            logger.error("Get access error: %s", e)
+            return []
 
-                headers = {
-                    'Origin': self.base_url,
-                    'Content-Type': content_type,
-                    'Cookie': f'sessionid={self._get_session_id()}',
-                    'Referer': f"{self.base_url}/"
-                }
+    def _check_user_access(self, username, pine_id):
+        """Check a single user's access to a single pine script"""
+        access_details = {
+            "pine_id": pine_id,
+            "username": username,
+            "hasAccess": False,
+            "noExpiration": False,
+            "currentExpiration": datetime.now().isoformat(),
+            "checked": False
+        }
 
-                response = self.session.post(
-                    list_users_url,
-                    data=body,
-                    headers=headers
-                )
+        try:
+            # Use TradingView's list_users API to check access
+            list_users_url = f"{self.base_url}/pine_perm/list_users/?limit=10&order_by=-created"
 
-                access_details = {
-                    "pine_id": pine_id,
-                    "username": username,
-                    "hasAccess": False,
-                    "noExpiration": False,
-                    "currentExpiration": datetime.now().isoformat()
-                }
+            from urllib3 import encode_multipart_formdata
+            payload = {
+                'pine_id': pine_id,
+                'username': username
+            }
 
-                if response.status_code == 200:
-                    try:
-                        data = response.json()
-                        users = data.get('results', [])
+            body, content_type = encode_multipart_formdata(payload)
 
-                        for user in users:
-                            if user['username'].lower() == username.lower():
-                                access_details['hasAccess'] = True
-                                str_expiration = user.get("expiration")
-                                if str_expiration is not None:
-                                    access_details['currentExpiration'] = user['expiration']
-                                    access_details['noExpiration'] = False
-                                else:
-                                    access_details['noExpiration'] = True
-                                break
+            headers = {
+                'Origin': self.base_url,
+                'Content-Type': content_type,
+                'Cookie': f'sessionid={self._get_session_id()}',
+                'Referer': f"{self.base_url}/"
+            }
 
-                    except Exception as e:
-                        logger.error(f"Error parsing access data for {pine_id}: {e}")
+            response = self._session_request(
+                "POST", "pine_perm_list_users",
+                list_users_url,
+                data=body,
+                headers=headers
+            )
 
-                results.append(access_details)
+            if response.status_code == 200:
+                data = response.json()
+                users = data.get('results', [])
+                access_details['checked'] = True
 
-            return results
+                for user in users:
+                    if user['username'].lower() == username.lower():
+                        access_details['hasAccess'] = True
+                        str_expiration = user.get("expiration")
+                        if str_expiration is not None:
+                            access_details['currentExpiration'] = user['expiration']
+                            access_details['noExpiration'] = False
+                        else:
+                            access_details['noExpiration'] = True
+                        break
 
         except Exception as e:
-            logger.error(f"Get access error: {e}")
-            return []
+            logger.error("Error parsing access data for %s: %s", pine_id, e)
+
+        return access_details
 
     def grant_access(self, username, pine_ids, duration="1L"):
         """Grant access to user for specified pine scripts"""
+        results = []
+        for grant in self.grant_many(username, pine_ids, duration):
+            results.append({
+                "pine_id": grant["pine_id"],
+                "username": username,
+                "hasAccess": grant["success"],
+                "noExpiration": duration == "1L",
+                "currentExpiration": datetime.now().isoformat(),
+                "expiration": (datetime.now() + timedelta(days=365)).isoformat(),
+                "status": "Success" if grant["success"] else grant["message"]
+            })
+        return results
+
+    def grant_many(self, username, pine_ids, duration="1L"):
+        """Grant a user lifetime ("1L") or timed access to many scripts in one batch"""
+        if not pine_ids:
+            return []
         try:
             if not self._ensure_authenticated():
-                return []
-
-            logger.info(f"Attempting to grant access for {username} to {len(pine_ids)} scripts")
-
-            results = []
-            for pine_id in pine_ids:
-                logger.info(f"Processing grant access for {username} to {pine_id}")
-
-                # Use real TradingView Pine permission API endpoints
-                add_access_url = f"{self.base_url}/pine_perm/add/"
-
-                # Prepare multipart form data as required by TradingView
-                from urllib3 import encode_multipart_formdata
-
-                payload = {
-                    'pine_id': pine_id,
-                    'username_recip': username
-                }
-
-                # Add expiration if not lifetime
-                if duration != "1L":
-                    # Convert duration to expiration date
-                    expiration_date = self._calculate_expiration(duration)
-                    if expiration_date:
-                        payload['expiration'] = expiration_date
-
-                body, content_type = encode_multipart_formdata(payload)
-
-                headers = {
-                    'Origin': self.base_url,
-                    'Content-Type': content_type,
-                    'Cookie': f'sessionid={self._get_session_id()}',
-                    'Referer': f"{self.base_url}/"
-                }
+                return [self._grant_result(pine_id, False, "Authentication failed", retryable=True)
+                        for pine_id in pine_ids]
+
+            logger.info("Attempting to grant access for %s to %s scripts", username, len(pine_ids))
+
+            # Everything but the pine_id is shared by the batch, so it is computed and encoded once
+            fields = {'username_recip': username}
+            expiration = None
+            if duration != "1L":
+                expiration = self._calculate_expiration(duration)
+                if expiration:
+                    fields['expiration'] = expiration
+            encode = self._permission_body_template(fields)
+
+            workers = max(1, min(Config.TRADINGVIEW_MAX_WORKERS, len(pine_ids)))
+            grant = tracing.wrap(lambda pine_id: self._grant_one(username, pine_id, encode, expiration))
+            if workers == 1:
+                return [grant(pine_id) for pine_id in pine_ids]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(grant, pine_ids))
 
-                response = self.session.post(
-                    add_access_url,
-                    data=body,
-                    headers=headers
-                )
+        except Exception as e:
+            logger.error("Grant access error: %s", e)
+            return [self._grant_result(pine_id, False, str(e), retryable=_is_transient(error=e)) for pine_id in pine_ids]
 
-                logger.debug(f"Grant access API response: {response.status_code}")
+    def _grant_one(self, username, pine_id, encode, expiration):
+        """Send one pine_perm/add request of a batch"""
+        logger.info("Attempting to grant access for %s to %s", username, pine_id,
+                    extra={'sample_key': 'grant_item'})
+        try:
+            body, content_type = encode(pine_id)
+            headers = {
+                'Origin': self.base_url,
+                'Content-Type': content_type,
+                'Cookie': f'sessionid={self._get_session_id()}',
+                'Referer': f"{self.base_url}/"
+            }
 
-                access_result = {
-                    "pine_id": pine_id,
-                    "username": username,
-                    "hasAccess": False,
-                    "noExpiration": duration == "1L",
-                    "currentExpiration": datetime.now().isoformat(),
-                    "expiration": (datetime.now() + timedelta(days=365)).isoformat(),
-                    "status": "Failed"
-                }
+            response = self._session_request(
+                "POST", "pine_perm_add",
+                f"{self.base_url}/pine_perm/add/",
+                data=body,
+                headers=headers
+            )
 
-                # HTTP 200 (OK) and 201 (Created) both indicate success
-                if response.status_code in [200, 201]:
-                    access_result.update({
-                        "hasAccess": True,
-                        "status": "Success"
-                    })
-                    logger.info(f"Successfully granted access for {username} to {pine_id}")
-                else:
-                    access_result["status"] = f"Failed: HTTP {response.status_code}"
-                    logger.error(f"Grant access failed with status {response.status_code}")
+            logger.debug("Grant access API response: %s", response.status_code)
 
-                results.append(access_result)
-                time.sleep(0.1)  # Small delay between requests
+            # HTTP 200 (OK) and 201 (Created) both indicate success
+            if response.status_code in [200, 201]:
+                logger.info("Successfully granted access for %s to %s", username, pine_id)
+                return self._grant_result(pine_id, True, "Access granted successfully", expiration)
+            logger.error("Grant access failed with status %s", response.status_code)
+            return self._grant_result(pine_id, False, f"Failed: HTTP {response.status_code}",
+                                      retryable=_is_transient(response.status_code))
 
-            return results
+        except Exception as e:
+            logger.error("Grant access error: %s", e)
+            return self._grant_result(pine_id, False, str(e), retryable=_is_transient(error=e))
 
+    def _modify_expiration(self, username, pine_id, expiration):
+        """Change the expiration of an existing grantee via pine_perm/modify_user_expiration"""
+        try:
+            from urllib3 import encode_multipart_formdata
+            body, content_type = encode_multipart_formdata(
+                {'pine_id': pine_id, 'username_recip': username, 'expiration': expiration})
+            headers = {
+                'Origin': self.base_url,
+                'Content-Type': content_type,
+                'Cookie': f'sessionid={self._get_session_id()}',
+                'Referer': f"{self.base_url}/"
+            }
+            response = self._session_request(
+                "POST", "pine_perm_modify_expiration",
+                f"{self.base_url}/pine_perm/modify_user_expiration/",
+                data=body,
+                headers=headers
+            )
+            if response.status_code in [200, 201]:
+                return {"username": username, "success": True, "message": "Expiration updated successfully",
+                        "expiration": expiration}
+            logger.error("Modify expiration failed for %s on %s with status %s", username, pine_id,
+                         response.status_code)
+            return {"username": username, "success": False, "message": f"Failed: HTTP {response.status_code}",
+                    "expiration": expiration}
         except Exception as e:
-            logger.error(f"Grant access error: {e}")
+            logger.error("Modify expiration error: %s", e)
+            return {"username": username, "success": False, "message": str(e), "expiration": expiration}
+
+    def set_expirations(self, pine_id, updates, on_result=None):
+        """Change expirations [(username, expiration), ...] of existing grantees concurrently; returns per-user results"""
+        if not updates:
             return []
+        if not self._ensure_authenticated():
+            return [{"username": username, "success": False, "message": "Authentication failed",
+                     "expiration": expiration} for username, expiration in updates]
+
+        def update(item):
+            username, expiration = item
+            result = self._modify_expiration(username, pine_id, expiration)
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        workers = max(1, min(Config.TRADINGVIEW_MAX_WORKERS, len(updates)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(tracing.wrap(update), updates))
+
+    @staticmethod
+    def _grant_result(pine_id, success, message, expiration=None, retryable=False):
+        return {"pine_id": pine_id, "success": success, "message": message, "expiration": expiration,
+                "retryable": retryable}
+
+    @staticmethod
+    def _permission_body_template(fields):
+        """Encode shared multipart fields once; returns encode(pine_id) -> (body, content_type)"""
+        from urllib3 import encode_multipart_formdata
+        from urllib3.filepost import choose_boundary
+
+        boundary = choose_boundary()
+        shared_body, content_type = encode_multipart_formdata(fields, boundary=boundary)
+
+        def encode(pine_id):
+            part = (f'--{boundary}\r\nContent-Disposition: form-data; name="pine_id"\r\n\r\n'
+                    f'{pine_id}\r\n').encode('utf-8')
+            return part + shared_body, content_type
+        return encode
 
     def remove_access(self, username, pine_ids):
         """Remove access from user for specified pine scripts using real TradingView API"""
@@ -365,7 +692,8 @@ class TradingViewAPI:
                     'Referer': f"{self.base_url}/"
                 }
 
-                response = self.session.post(
+                response = self._session_request(
+                    "POST", "pine_perm_remove",
                     remove_url,
                     data=body,
                     headers=headers
@@ -382,63 +710,69 @@ class TradingViewAPI:
 
                 if response.status_code == 200:
                     access_result["hasAccess"] = False  # Access removed successfully
-                    logger.info(f"Successfully removed access for {username} from {pine_id}")
+                    logger.info("Successfully removed access for %s from %s", username, pine_id)
                 else:
-                    logger.error(f"Failed to remove access for {username} from {pine_id}: {response.status_code}")
+                    logger.error("Failed to remove access for %s from %s: %s", username, pine_id, response.status_code)
 
                 results.append(access_result)
-                time.sleep(0.2)  # Rate limiting
+                self._pace(0.2, "remove_access")  # Rate limiting
 
             return results
 
         except Exception as e:
-            logger.error(f"Remove access error: {e}")
+            logger.error("Remove access error: %s", e)
             return []
 
     def _ensure_authenticated(self):
         """Ensure session is authenticated"""
-        # Check if current session is valid
-        try:
-            test_response = self.session.get(f"{self.base_url}/chart/")
-            if test_response.status_code == 200 and 'accounts/signin' not in test_response.url:
+        with tracing.span("auth.ensure", "auth"):
+            return self._check_or_authenticate()
+
+    def _check_or_authenticate(self):
+        """Probe the current session and sign in again if it is no longer valid"""
+        # A recent successful probe or sign-in is trusted until it expires or a request is rejected
+        if self._auth_trusted():
+            return True
+
+        # Concurrent callers wait for one probe (and sign-in) instead of each running their own
+        with self._auth_lock:
+            if self._auth_trusted():
                 return True
-        except:
-            pass
 
-        # Session invalid, re-authenticate
-        return self._authenticate()
+            if self._probe_session():
+                self._auth_verified_at = time.monotonic()
+                return True
 
-    def _get_fresh_csrf_token(self):
-        """Get a fresh CSRF token from the current session"""
+            # Session invalid, re-authenticate
+            authenticated = self._authenticate()
+            metrics.tradingview_reauth_total.inc(result="success" if authenticated else "failure")
+            if authenticated:
+                self._auth_verified_at = time.monotonic()
+            return authenticated
+
+    def _auth_trusted(self):
+        # None until the first probe; 0.0 would read as recent on a host up for less than the TTL
+        verified_at = self._auth_verified_at
+        return verified_at is not None and time.monotonic() - verified_at < Config.TRADINGVIEW_AUTH_PROBE_TTL
+
+    def _probe_session(self):
+        """Check the session from the /chart/ status and redirect target without downloading the page"""
         try:
-            # Get CSRF token from chart page
-            response = self.session.get(f"{self.base_url}/chart/")
+            response = self._request("GET", "chart_probe", f"{self.base_url}/chart/",
+                                     stream=True, allow_redirects=False)
+            response.close()
             if response.status_code == 200:
-                csrf_patterns = [
-                    r'window\.__csrfToken\s*=\s*["\']([^"\']+)["\']',
-                    r'csrfToken["\']?\s*:\s*["\']([^"\']+)["\']',
-                    r'csrf_token["\']?\s*:\s*["\']([^"\']+)["\']',
-                    r'authenticity_token["\']?\s*["\']([^"\']+)["\']'
-                ]
-
-                for pattern in csrf_patterns:
-                    match = re.search(pattern, response.text)
-                    if match:
-                        self.csrf_token = match.group(1)
-                        logger.debug("Fresh CSRF token extracted")
-                        return self.csrf_token
-
-                # Also check cookies for CSRF token
-                for cookie in self.session.cookies:
-                    if 'csrf' in cookie.name.lower():
-                        self.csrf_token = cookie.value
-                        logger.debug(f"CSRF token found in cookie: {cookie.name}")
-                        return self.csrf_token
-
+                return True
+            if response.status_code in (301, 302, 303, 307, 308):
+                return 'accounts/signin' not in response.headers.get('Location', '')
         except Exception as e:
-            logger.debug(f"Error getting fresh CSRF token: {e}")
+            logger.debug("Session probe error: %s", e)
+        return False
 
-        return None
+    def _get_fresh_csrf_token(self):
+        """Get a fresh CSRF token from the current session"""
+        self.csrf.invalidate()
+        return self.csrf.refresh("chart")
 
     def _get_session_id(self):
         """Get session ID from cookies"""
@@ -447,34 +781,44 @@ class TradingViewAPI:
                 return cookie.value
         return None
 
-    def _calculate_expiration(self, duration):
-        """Calculate expiration date from duration string (e.g., '7D', '2M', '1L')"""
+    def _calculate_expiration(self, duration, start=None):
+        """Calculate expiration date from duration string (e.g., '7D', '2M', '1L'), counted from start or now"""
         try:
             if duration == "1L":
                 return None  # Lifetime access
 
             from datetime import datetime, timedelta
+            start = start or datetime.now()
 
             if duration.endswith('D'):
                 days = int(duration[:-1])
-                expiration = datetime.now() + timedelta(days=days)
+                expiration = start + timedelta(days=days)
             elif duration.endswith('M'):
                 months = int(duration[:-1])
-                expiration = datetime.now() + timedelta(days=months * 30)
+                expiration = start + timedelta(days=months * 30)
             elif duration.endswith('Y'):
                 years = int(duration[:-1])
-                expiration = datetime.now() + timedelta(days=years * 365)
+                expiration = start + timedelta(days=years * 365)
             else:
                 # Default to 30 days if format not recognized
-                expiration = datetime.now() + timedelta(days=30)
+                expiration = start + timedelta(days=30)
 
             return expiration.strftime('%Y-%m-%d %H:%M:%S')
 
         except Exception as e:
-            logger.error(f"Error calculating expiration: {e}")
+            logger.error("Error calculating expiration: %s", e)
             return None
 
     def get_script_users(self, pine_id):
+        """Get all users of a Pine Script, sharing the fetch with concurrent calls for the same script"""
+        try:
+            return self._script_users_flights.do(pine_id, lambda: self._get_script_users(pine_id),
+                                                 timeout=Config.SINGLE_FLIGHT_TIMEOUT)
+        except SingleFlightTimeout as e:
+            logger.error("Error getting script users for %s: %s", pine_id, e)
+            return []
+
+    def _get_script_users(self, pine_id):
         """Get all usernames that have access to a specific Pine Script with comprehensive pagination"""
         try:
             if not self._ensure_authenticated():
@@ -485,8 +829,9 @@ class TradingViewAPI:
             limit = 50  # Use smaller batches to ensure we get all results
             max_attempts = 100  # Safety limit to prevent infinite loops
             attempts = 0
+            complete = False  # Set once the last page was read; a failed fetch must not look like an empty script
             
-            logger.info(f"Starting to fetch all users for {pine_id}")
+            logger.info("Starting to fetch all users for %s", pine_id)
             
             while attempts < max_attempts:
                 attempts += 1
@@ -511,7 +856,8 @@ class TradingViewAPI:
                     'Referer': f"{self.base_url}/"
                 }
 
-                response = self.session.post(
+                response = self._session_request(
+                    "POST", "pine_perm_list_users",
                     list_users_url,
                     data=body,
                     headers=headers
@@ -522,19 +868,20 @@ class TradingViewAPI:
                         data = response.json()
                         users = data.get('results', [])
                         
-                        logger.debug(f"Batch {attempts}: Got {len(users)} users at offset {offset}")
-                        logger.debug(f"API response keys: {list(data.keys())}")
+                        logger.debug("Batch %s: Got %s users at offset %s", attempts, len(users), offset)
+                        logger.debug("API response keys: %s", data.keys())
                         
                         # Check for pagination metadata
                         total_count = data.get('count', 0)
                         next_url = data.get('next')
                         has_next = data.get('has_next', False)
                         
-                        logger.debug(f"Total count in API: {total_count}, has_next: {has_next}, next_url: {next_url}")
+                        logger.debug("Total count in API: %s, has_next: %s, next_url: %s", total_count, has_next, next_url)
                         
                         # No more users to fetch
                         if not users:
-                            logger.info(f"No more users found at offset {offset}")
+                            logger.info("No more users found at offset %s", offset)
+                            complete = True
                             break
                             
                         # Add users from this batch
@@ -549,45 +896,50 @@ class TradingViewAPI:
                             all_users.append(user_info)
                             batch_count += 1
 
-                        logger.info(f"Added {batch_count} users from batch {attempts}, total now: {len(all_users)}")
+                        logger.info("Added %s users from batch %s, total now: %s", batch_count, attempts, len(all_users),
+                                    extra={'sample_key': 'list_users_batch'})
 
                         # Check multiple exit conditions
                         # 1. If API says no more pages
                         if not has_next and next_url is None:
                             logger.info("API indicates no more pages")
+                            complete = True
                             break
                             
                         # 2. If we got fewer results than requested
                         if len(users) < limit:
-                            logger.info(f"Got {len(users)} users (less than limit {limit}), assuming end")
+                            logger.info("Got %s users (less than limit %s), assuming end", len(users), limit)
+                            complete = True
                             break
                             
                         # 3. If total_count is available and we've reached it
                         if total_count > 0 and len(all_users) >= total_count:
-                            logger.info(f"Reached total count: {len(all_users)}/{total_count}")
+                            logger.info("Reached total count: %s/%s", len(all_users), total_count)
+                            complete = True
                             break
                             
                         # Move to next batch
                         offset += limit
                         
                         # Add delay between requests to avoid rate limiting
-                        time.sleep(0.2)
+                        self._pace(0.2, "list_users_page")
 
                     except Exception as e:
-                        logger.error(f"Error parsing users data for {pine_id} at batch {attempts}: {e}")
+                        logger.error("Error parsing users data for %s at batch %s: %s", pine_id, attempts, e)
                         # Try to continue with next batch in case it was a temporary error
                         offset += limit
                         continue
                 else:
-                    logger.error(f"API request failed with status {response.status_code} at batch {attempts}")
+                    logger.error("API request failed with status %s at batch %s", response.status_code, attempts)
                     # Try a few more times with increasing delays
                     if attempts < 3:
-                        time.sleep(1)
+                        metrics.tradingview_retries_total.inc(endpoint="pine_perm_list_users")
+                        self._pace(1, "list_users_retry")
                         continue
                     else:
                         break
 
-            logger.info(f"Completed fetching users for {pine_id}: Found {len(all_users)} total users in {attempts} attempts")
+            logger.info("Completed fetching users for %s: Found %s total users in %s attempts", pine_id, len(all_users), attempts)
             
             # Remove duplicates based on username (just in case)
             unique_users = []
@@ -599,67 +951,29 @@ class TradingViewAPI:
                     seen_usernames.add(username)
             
             if len(unique_users) != len(all_users):
-                logger.info(f"Removed {len(all_users) - len(unique_users)} duplicate users")
+                logger.info("Removed %s duplicate users", len(all_users) - len(unique_users))
+
+            if complete:
+                # Every complete fetch refreshes the user index, including scripts nobody has access to
+                from user_index import user_access_index
+                user_access_index.sync_script(pine_id, unique_users)
             
             return unique_users
 
         except Exception as e:
-            logger.error(f"Error getting script users for {pine_id}: {e}")
+            logger.error("Error getting script users for %s: %s", pine_id, e)
             return []
 
     def add_pine_permission(self, username, pine_id):
         """Add Pine Script permission for a user"""
-        try:
-            if not self._ensure_authenticated():
-                return {"success": False, "message": "Authentication failed"}
-
-            logger.info(f"Attempting to grant access for {username} to {pine_id}")
-
-            # Use real TradingView Pine permission API endpoints
-            add_access_url = f"{self.base_url}/pine_perm/add/"
-
-            # Prepare multipart form data as required by TradingView
-            from urllib3 import encode_multipart_formdata
-
-            payload = {
-                'pine_id': pine_id,
-                'username_recip': username
-            }
-
-            body, content_type = encode_multipart_formdata(payload)
-
-            headers = {
-                'Origin': self.base_url,
-                'Content-Type': content_type,
-                'Cookie': f'sessionid={self._get_session_id()}',
-                'Referer': f"{self.base_url}/"
-            }
-
-            response = self.session.post(
-                add_access_url,
-                data=body,
-                headers=headers
-            )
-
-            logger.debug(f"Grant access API response: {response.status_code}")
-
-            # HTTP 200 (OK) and 201 (Created) both indicate success
-            if response.status_code in [200, 201]:
-                logger.info(f"Successfully granted access for {username} to {pine_id}")
-                return {"success": True, "message": "Access granted successfully"}
-            else:
-                logger.error(f"Grant access failed with status {response.status_code}")
-                return {"success": False, "message": f"Failed: HTTP {response.status_code}"}
-
-        except Exception as e:
-            logger.error(f"Grant access error: {e}")
-            return {"success": False, "message": str(e)}
+        result = self.grant_many(username, [pine_id], "1L")[0]
+        return {"success": result["success"], "message": result["message"]}
 
     def remove_pine_permission(self, username, pine_id):
         """Remove Pine Script permission for a user"""
         try:
             if not self._ensure_authenticated():
-                return {"success": False, "message": "Authentication failed"}
+                return {"success": False, "message": "Authentication failed", "retryable": True}
 
             # Use TradingView's remove access API
             remove_url = f"{self.base_url}/pine_perm/remove/"
@@ -679,22 +993,153 @@ class TradingViewAPI:
                 'Referer': f"{self.base_url}/"
             }
 
-            response = self.session.post(
+            response = self._session_request(
+                "POST", "pine_perm_remove",
                 remove_url,
                 data=body,
                 headers=headers
             )
 
             if response.status_code == 200:
-                logger.info(f"Successfully removed access for {username} from {pine_id}")
+                logger.info("Successfully removed access for %s from %s", username, pine_id)
                 return {"success": True, "message": "Access removed successfully"}
             else:
-                logger.error(f"Failed to remove access for {username} from {pine_id}: {response.status_code}")
-                return {"success": False, "message": f"Failed: HTTP {response.status_code}"}
+                logger.error("Failed to remove access for %s from %s: %s", username, pine_id, response.status_code)
+                return {"success": False, "message": f"Failed: HTTP {response.status_code}",
+                        "retryable": _is_transient(response.status_code)}
 
         except Exception as e:
-            logger.error(f"Remove access error: {e}")
-            return {"success": False, "message": str(e)}
+            logger.error("Remove access error: %s", e)
+            return {"success": False, "message": str(e), "retryable": _is_transient(error=e)}
+
+    def warm_up(self, pine_ids=()):
+        """Validate the session, pre-open pooled connections and optionally prefetch script user lists"""
+        start = time.perf_counter()
+        if not self._ensure_authenticated():
+            logger.warning("Warm-up could not authenticate with TradingView")
+            return False
+
+        # The probe closes its connection early, so open the pooled connections concurrently
+        connections = Config.WARMUP_CONNECTIONS
+        if connections > 0:
+            with ThreadPoolExecutor(max_workers=connections) as executor:
+                list(executor.map(lambda _: self._request("HEAD", "warm_up", f"{self.base_url}/"), range(connections)))
+
+        if pine_ids:
+            # Each fetch syncs the user index as it completes
+            workers = max(1, min(Config.TRADINGVIEW_MAX_WORKERS, len(pine_ids)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(self.get_script_users, pine_ids))
+
+        logger.info("TradingView warm-up finished in %.2fs", time.perf_counter() - start)
+        return True
+
+class TradingViewClientPool:
+    """One TradingViewAPI client per owner account, with pine_ids routed to the account that owns them"""
+
+    def __init__(self, accounts=None):
+        accounts = load_accounts() if accounts is None else accounts
+        self.default = TradingViewAPI()
+        self.clients = {self.default.name: self.default}
+        self.routes = {}  # pine_id -> account name
+        for account in accounts:
+            client = TradingViewAPI(account)
+            self.clients[client.name] = client
+            for pine_id in account.get('pine_ids', []):
+                self.routes[pine_id] = client.name
+        if accounts:
+            logger.info("TradingView client pool: %s accounts, %s routed scripts", len(self.clients), len(self.routes))
+
+    def client_for(self, pine_id):
+        """Client of the account that owns pine_id (the default account for unrouted scripts)"""
+        return self.clients[self.routes.get(pine_id, self.default.name)]
+
+    def _per_account(self, pine_ids, call):
+        """Run call(client, pine_ids) per owning account, concurrently, and merge results in pine_ids order"""
+        groups = {}
+        for pine_id in pine_ids:
+            groups.setdefault(self.client_for(pine_id), []).append(pine_id)
+        if len(groups) <= 1:
+            client, ids = next(iter(groups.items()), (self.default, list(pine_ids)))
+            return call(client, ids)
+
+        with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+            futures = [executor.submit(tracing.wrap(call), client, ids) for client, ids in groups.items()]
+            results = [result for future in futures for result in future.result()]
+        position = {pine_id: index for index, pine_id in enumerate(pine_ids)}
+        results.sort(key=lambda result: position.get(result.get('pine_id'), len(position)))
+        return results
+
+    def validate_username(self, username):
+        return self.default.validate_username(username)
+
+    def get_user_access(self, username, pine_ids):
+        return self._per_account(pine_ids, lambda client, ids: client.get_user_access(username, ids))
 
-# Global API instance
-tv_api = TradingViewAPI()
\ No newline at end of file
+    def grant_access(self, username, pine_ids, duration="1L"):
+        return self._per_account(pine_ids, lambda client, ids: client.grant_access(username, ids, duration))
+
+    def grant_many(self, username, pine_ids, duration="1L"):
+        return self._per_account(pine_ids, lambda client, ids: client.grant_many(username, ids, duration))
+
+    def remove_access(self, username, pine_ids):
+        return self._per_account(pine_ids, lambda client, ids: client.remove_access(username, ids))
+
+    def get_script_users(self, pine_id):
+        return self.client_for(pine_id).get_script_users(pine_id)
+
+    def set_expirations(self, pine_id, updates, on_result=None):
+        return self.client_for(pine_id).set_expirations(pine_id, updates, on_result)
+
+    def add_pine_permission(self, username, pine_id):
+        return self.client_for(pine_id).add_pine_permission(username, pine_id)
+
+    def remove_pine_permission(self, username, pine_id):
+        return self.client_for(pine_id).remove_pine_permission(username, pine_id)
+
+    def warm_up(self, pine_ids=()):
+        """Warm up every account, each prefetching the scripts it owns"""
+        owned = {name: [] for name in self.clients}
+        for pine_id in pine_ids:
+            owned[self.client_for(pine_id).name].append(pine_id)
+        with ThreadPoolExecutor(max_workers=len(self.clients)) as executor:
+            results = list(executor.map(lambda client: client.warm_up(owned[client.name]), self.clients.values()))
+        return all(results)
+
+    def __getattr__(self, name):
+        # Account-independent helpers (e.g. _calculate_expiration) come from the default client
+        if name == 'default':
+            raise AttributeError(name)
+        return getattr(self.default, name)
+
+class LazyTradingViewAPI:
+    """Builds the TradingView client pool (and reads the session files) on first use"""
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = TradingViewClientPool()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def start_warm_up(self, pine_ids=()):
+        """Run warm_up in a background thread so startup never waits on TradingView"""
+        def run():
+            try:
+                self.get().warm_up(pine_ids)
+            except Exception as e:
+                logger.error("TradingView warm-up error: %s", e)
+
+        thread = threading.Thread(target=run, name="tradingview-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+# Global API instance (constructed lazily)
+tv_api = LazyTradingViewAPI()
\ No newline at end of file
@@ -0,0 +1,135 @@
+import threading
+import time
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class UserAccessIndex:
+    """Inverted username -> {pine_id: expiration} index built from synced script user lists"""
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else Config.USER_INDEX_TTL
+        self._lock = threading.Lock()
+        # username (lowercase) -> {pine_id: {"username", "expiration", "created"}}
+        self._by_user = {}
+        # pine_id -> set of lowercase usernames currently indexed for it
+        self._by_script = {}
+        # pine_id -> time of the last full user list sync
+        self._synced_at = {}
+        # pine_id -> {username (lowercase): time of the last single-user check}; a full sync supersedes them
+        self._checked_at = {}
+
+    def sync_script(self, pine_id, users):
+        """Replace the indexed entries of a script with a freshly fetched (possibly empty) user list"""
+        now = time.time()
+        with self._lock:
+            self._checked_at.pop(pine_id, None)
+            for key in self._by_script.pop(pine_id, set()):
+                entries = self._by_user.get(key)
+                if entries is not None:
+                    entries.pop(pine_id, None)
+                    if not entries:
+                        del self._by_user[key]
+
+            keys = set()
+            for user in users:
+                username = user.get('username', '')
+                if not username:
+                    continue
+                key = username.lower()
+                self._by_user.setdefault(key, {})[pine_id] = {
+                    'username': username,
+                    'expiration': user.get('expiration'),
+                    'created': user.get('created')
+                }
+                keys.add(key)
+
+            self._by_script[pine_id] = keys
+            self._synced_at[pine_id] = now
+
+        logger.debug("User index synced %s users for %s", len(keys), pine_id)
+
+    def record_access(self, username, pine_id, has_access, expiration=None):
+        """Record the outcome of a single-user check, grant or removal"""
+        key = username.lower()
+        with self._lock:
+            if has_access:
+                self._by_user.setdefault(key, {})[pine_id] = {
+                    'username': username,
+                    'expiration': expiration,
+                    'created': None
+                }
+                self._by_script.setdefault(pine_id, set()).add(key)
+            else:
+                entries = self._by_user.get(key)
+                if entries is not None:
+                    entries.pop(pine_id, None)
+                    if not entries:
+                        del self._by_user[key]
+                self._by_script.get(pine_id, set()).discard(key)
+            self._checked_at.setdefault(pine_id, {})[key] = time.time()
+
+    def update_expirations(self, pine_id, expirations):
+        """Apply changed expirations {username: expiration} of a script's existing entries"""
+        now = time.time()
+        with self._lock:
+            for username, expiration in expirations.items():
+                key = username.lower()
+                entries = self._by_user.setdefault(key, {})
+                entry = entries.get(pine_id)
+                if entry is None:
+                    entries[pine_id] = {'username': username, 'expiration': expiration, 'created': None}
+                    self._by_script.setdefault(pine_id, set()).add(key)
+                else:
+                    entry['expiration'] = expiration
+                self._checked_at.setdefault(pine_id, {})[key] = now
+
+    def forget_script(self, pine_id):
+        """Drop every indexed entry of a script (e.g. when it leaves the catalog)"""
+        self.sync_script(pine_id, [])
+        with self._lock:
+            self._synced_at.pop(pine_id, None)
+
+    def synced_at(self, pine_id):
+        """Time of the script's last full sync (0 if never)"""
+        with self._lock:
+            return self._synced_at.get(pine_id, 0)
+
+    def _is_fresh(self, key, pine_id, now):
+        checked = max(self._synced_at.get(pine_id, 0), self._checked_at.get(pine_id, {}).get(key, 0))
+        return now - checked <= self.ttl
+
+    def lookup(self, username, pine_ids):
+        """Return (access entries, stale pine_ids) for a user in one local read"""
+        key = username.lower()
+        now = time.time()
+        results = []
+        stale = []
+        with self._lock:
+            entries = self._by_user.get(key, {})
+            for pine_id in pine_ids:
+                if not self._is_fresh(key, pine_id, now):
+                    stale.append(pine_id)
+                    continue
+                entry = entries.get(pine_id)
+                results.append({
+                    "pine_id": pine_id,
+                    "username": entry['username'] if entry else username,
+                    "hasAccess": entry is not None,
+                    "noExpiration": entry is not None and entry['expiration'] is None,
+                    "currentExpiration": entry['expiration'] if entry else None
+                })
+        return results, stale
+
+    def stats(self):
+        """Return index size information"""
+        with self._lock:
+            return {
+                "users": len(self._by_user),
+                "scripts": len(self._synced_at),
+                "entries": sum(len(entries) for entries in self._by_user.values())
+            }
+
+# Global index instance
+user_access_index = UserAccessIndex()
@@ -0,0 +1,93 @@
+import secrets
+import threading
+import time
+import logging
+from collections import OrderedDict
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class UserListSnapshots:
+    """Bounded, TTL-evicted store of fetched script user lists, addressed by snapshot id.
+
+    Snapshots live in one worker process's memory. A request that lands on another worker (or
+    after eviction) finds no snapshot, and every caller then refetches the list from TradingView.
+    """
+
+    def __init__(self, ttl=None, max_entries=None):
+        self.ttl = ttl if ttl is not None else Config.USER_SNAPSHOT_TTL
+        self.max_entries = max_entries if max_entries is not None else Config.USER_SNAPSHOT_MAX
+        self._entries = OrderedDict()  # snapshot id -> {"pine_id", "users", "created_at"}
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        expired = [snapshot_id for snapshot_id, entry in self._entries.items()
+                   if now - entry['created_at'] >= self.ttl]
+        for snapshot_id in expired:
+            del self._entries[snapshot_id]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def create(self, pine_id, users):
+        """Store a user list and return its snapshot id"""
+        snapshot_id = secrets.token_urlsafe(12)
+        now = time.time()
+        with self._lock:
+            self._entries[snapshot_id] = {'pine_id': pine_id, 'users': list(users), 'created_at': now}
+            self._evict(now)
+        logger.debug("Stored user snapshot %s for %s (%s users)", snapshot_id, pine_id, len(users))
+        return snapshot_id
+
+    def get(self, snapshot_id, pine_id):
+        """Return the users of a live snapshot taken for pine_id, or None"""
+        if not snapshot_id:
+            return None
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(snapshot_id)
+            if entry is None or entry['pine_id'] != pine_id:
+                return None
+            self._entries.move_to_end(snapshot_id)
+            return list(entry['users'])
+
+    def remove_users(self, snapshot_id, usernames):
+        """Drop users whose access was removed so the snapshot stays accurate"""
+        removed = {username.lower() for username in usernames}
+        with self._lock:
+            entry = self._entries.get(snapshot_id)
+            if entry is not None:
+                entry['users'] = [user for user in entry['users']
+                                  if user.get('username', '').lower() not in removed]
+
+    def update_expirations(self, pine_id, expirations):
+        """Apply changed expirations {username: expiration} to every live snapshot of pine_id"""
+        changed = {username.lower(): expiration for username, expiration in expirations.items()}
+        with self._lock:
+            for entry in self._entries.values():
+                if entry['pine_id'] != pine_id:
+                    continue
+                for user in entry['users']:
+                    key = user.get('username', '').lower()
+                    if key in changed:
+                        user['expiration'] = changed[key]
+                        user['has_lifetime_access'] = changed[key] is None
+
+    def stats(self):
+        with self._lock:
+            self._evict(time.time())
+            return {"snapshots": len(self._entries), "ttl": self.ttl, "max_entries": self.max_entries}
+
+def filter_users(users, query='', access_type=''):
+    """Filter a user list by username substring and access type ("lifetime" or "temporary")"""
+    query = query.strip().lower()
+    if query:
+        users = [user for user in users if query in user.get('username', '').lower()]
+    if access_type == 'lifetime':
+        users = [user for user in users if user.get('has_lifetime_access')]
+    elif access_type == 'temporary':
+        users = [user for user in users if not user.get('has_lifetime_access')]
+    return users
+
+# Global snapshot store shared by the users modal, export and bulk removal
+user_snapshots = UserListSnapshots()